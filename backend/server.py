@@ -1,27 +1,51 @@
 from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, Request, Cookie
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder
+from starlette.background import BackgroundTask
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, InsertOne
+from pymongo.errors import BulkWriteError
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, NamedTuple, Iterator, Callable, Tuple, Union
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal, InvalidOperation
 from bson import ObjectId
 import os
 import uuid
 import pandas as pd
+import numpy as np
 import requests
 import logging
 from io import BytesIO
 import hashlib
+import base64
+import re
+import itertools
+import math
+import gzip
+import json
+import copy
+import tempfile
+import shutil
 import secrets
 import time
 import asyncio
 import threading
-from concurrent.futures import ThreadPoolExecutor
-from contextlib import asynccontextmanager
+import signal
+try:
+    import resource  # POSIX only - used for the Excel parse CPU budget
+except ImportError:
+    resource = None
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from contextlib import asynccontextmanager, contextmanager
+from collections import OrderedDict, Counter, defaultdict
+from functools import lru_cache
 
 from reportlab.lib.pagesizes import A4, letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -47,6 +71,126 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Product search - search_key holds the folded name/brand/description tokens
+TURKISH_FOLD = str.maketrans({
+    'ç': 'c', 'ğ': 'g', 'ı': 'i', 'ö': 'o', 'ş': 's', 'ü': 'u',
+    'Ç': 'c', 'Ğ': 'g', 'I': 'i', 'İ': 'i', 'Ö': 'o', 'Ş': 's', 'Ü': 'u'
+})
+SEARCH_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+def search_tokens(text: Optional[str]) -> List[str]:
+    """Lower-cased, Turkish-folded words of text"""
+    return SEARCH_TOKEN_PATTERN.findall((text or '').translate(TURKISH_FOLD).lower())
+
+def product_search_key(product: Dict[str, Any]) -> List[str]:
+    """Distinct search tokens of a product's name, brand and description"""
+    tokens = []
+    for field in ("name", "brand", "description"):
+        tokens.extend(search_tokens(product.get(field)))
+    return list(dict.fromkeys(tokens))
+
+# Optional in-memory trigram index for fuzzy, typo tolerant search (PRODUCT_SEARCH_INDEX=1).
+# Costs roughly 3 KB of RAM per product, so it is off by default on the Pi.
+PRODUCT_SEARCH_INDEX_ENABLED = os.environ.get('PRODUCT_SEARCH_INDEX', '0') == '1'
+PRODUCT_SEARCH_MIN_SCORE = float(os.environ.get('PRODUCT_SEARCH_MIN_SCORE', 0.7))  # share of query trigrams a match needs
+
+def word_trigrams(tokens, open_ended: bool = False) -> set:
+    """Trigrams of space-padded words; open_ended leaves the last word unpadded for search-as-you-type"""
+    grams = set()
+    for index, token in enumerate(tokens):
+        padded = f" {token}" if open_ended and index == len(tokens) - 1 else f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class TrigramSearchIndex:
+    """Trigram inverted index over product search_key tokens"""
+
+    def __init__(self):
+        self.ready = False
+        self.slots = {}  # product id -> slot
+        self.product_ids = []  # slot -> product id
+        self.slot_keys = []  # slot -> search_key tokens; trigrams are recomputed on change
+        self.free_slots = []
+        self.postings = defaultdict(set)  # trigram -> slots
+
+    def add(self, product_id: str, search_key: List[str]):
+        search_key = tuple(search_key)
+        grams = word_trigrams(search_key)
+        slot = self.slots.get(product_id)
+        if slot is None:
+            slot = self.free_slots.pop() if self.free_slots else len(self.product_ids)
+            if slot == len(self.product_ids):
+                self.product_ids.append(product_id)
+                self.slot_keys.append(())
+            self.product_ids[slot] = product_id
+            self.slots[product_id] = slot
+        old_grams = word_trigrams(self.slot_keys[slot])
+        for gram in old_grams - grams:
+            self._discard(gram, slot)
+        for gram in grams - old_grams:
+            self.postings[gram].add(slot)
+        self.slot_keys[slot] = search_key
+
+    def remove(self, product_id: str):
+        slot = self.slots.pop(product_id, None)
+        if slot is None:
+            return
+        for gram in word_trigrams(self.slot_keys[slot]):
+            self._discard(gram, slot)
+        self.product_ids[slot] = None
+        self.slot_keys[slot] = ()
+        self.free_slots.append(slot)
+
+    def _discard(self, gram: str, slot: int):
+        postings = self.postings[gram]
+        postings.discard(slot)
+        if not postings:
+            del self.postings[gram]
+
+    def search(self, query: Optional[str]) -> Optional[List[str]]:
+        """Ids of the products sharing enough trigrams with the query; None when the query has no trigrams"""
+        query_grams = word_trigrams(search_tokens(query), open_ended=True)
+        if not query_grams:
+            return None
+        counts = Counter()
+        for gram in query_grams:
+            counts.update(self.postings.get(gram, ()))
+        needed = math.ceil(len(query_grams) * PRODUCT_SEARCH_MIN_SCORE)
+        return [self.product_ids[slot] for slot, count in counts.items() if count >= needed]
+
+    def __len__(self):
+        return len(self.slots)
+
+product_search_index = TrigramSearchIndex() if PRODUCT_SEARCH_INDEX_ENABLED else None
+
+def index_products(products):
+    """Keep the in-memory search index in step with written products (id and search_key)"""
+    if product_search_index is not None:
+        for product in products:
+            if "search_key" in product:
+                product_search_index.add(product["id"], product["search_key"])
+
+def unindex_products(product_ids):
+    if product_search_index is not None:
+        for product_id in product_ids:
+            product_search_index.remove(product_id)
+
+def product_search_query(search: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Every search word must prefix a word of the product; anchored, so the search_key index is used
+    
+    With the in-memory index enabled and built, all of its fuzzy matches are used
+    instead, so counts and pages stay exact; lists keep their favorites-first order.
+    """
+    if product_search_index is not None and product_search_index.ready:
+        product_ids = product_search_index.search(search)
+        if product_ids is not None:
+            return {"id": {"$in": product_ids}}
+    clauses = [{"search_key": {"$regex": f"^{re.escape(token)}"}} for token in dict.fromkeys(search_tokens(search))]
+    if not clauses:
+        # Only punctuation: no product word can match it
+        return {"id": {"$in": []}} if search and search.strip() else None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
 # Create database indexes for better performance
 async def create_indexes():
     """Create database indexes for optimal performance with large datasets"""
@@ -58,9 +202,10 @@ async def create_indexes():
         await db.products.create_index("is_favorite")  # For favorites sorting
         await db.products.create_index("brand")  # For brand search
         await db.products.create_index("created_at")  # For date sorting
+        await db.products.create_index("search_key")  # For token prefix search (multikey)
         
         # PERFORMANCE: Compound indexes for common queries
-        await db.products.create_index([("is_favorite", -1), ("name", 1)])  # For favorites-first sorting
+        await db.products.create_index([("is_favorite", -1), ("name", 1), ("id", 1)])  # For favorites-first sorting and keyset pages
         await db.products.create_index([("company_id", 1), ("name", 1)])  # For company-filtered lists
         await db.products.create_index([("category_id", 1), ("name", 1)])  # For category-filtered lists
         await db.products.create_index([("is_favorite", -1), ("company_id", 1), ("name", 1)])  # For complex queries
@@ -157,19 +302,61 @@ async def lifespan(app: FastAPI):
     
     # Initialize database indexes and create default categories
     await create_indexes()
+    await backfill_search_keys()
+    await build_product_search_index()
     await create_supplies_category()
     await create_default_admin()
+    await recover_interrupted_imports()
     logger.info("Application startup completed")
     yield
     
     # Cleanup on shutdown
     logger.info("Shutting down application...")
     background_scheduler.stop()
+    if import_job_worker_task is not None:
+        import_job_worker_task.cancel()
+    for pool in worker_pools:
+        pool.shutdown()
     logger.info("Application shutdown completed")
 
 # Create the main app
 app = FastAPI(title="Karavan Elektrik Ekipmanları Fiyat Karşılaştırma API", lifespan=lifespan)
 
+# Products per bulk_write round trip during Excel imports
+EXCEL_IMPORT_BATCH_SIZE = int(os.environ.get('EXCEL_IMPORT_BATCH_SIZE', 500))
+SEARCH_KEY_BACKFILL_BATCH_SIZE = 500
+
+async def backfill_search_keys():
+    """One-shot migration: add search_key to products written before it existed"""
+    try:
+        cursor = db.products.find({"search_key": {"$exists": False}},
+                                  {"_id": 0, "id": 1, "name": 1, "brand": 1, "description": 1})
+        updated = 0
+        while batch := await cursor.to_list(SEARCH_KEY_BACKFILL_BATCH_SIZE):
+            await db.products.bulk_write([
+                UpdateOne({"id": product["id"]}, {"$set": {"search_key": product_search_key(product)}})
+                for product in batch
+            ], ordered=False)
+            updated += len(batch)
+        if updated:
+            logger.info(f"search_key backfilled for {updated} products")
+    except Exception as e:
+        logger.error(f"Error backfilling product search keys: {e}")
+
+async def build_product_search_index():
+    """Load search_key of every product into the in-memory index"""
+    if product_search_index is None:
+        return
+    try:
+        started = time.perf_counter()
+        async for product in db.products.find({}, {"_id": 0, "id": 1, "search_key": 1}):
+            product_search_index.add(product["id"], product.get("search_key") or [])
+        product_search_index.ready = True
+        logger.info(f"Product search index built: {len(product_search_index)} products "
+                    f"in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        logger.error(f"Error building product search index: {e}")
+
 # Initialize Sarf Malzemeleri Category
 async def create_supplies_category():
     """Create default 'Sarf Malzemeleri' category if it doesn't exist"""
@@ -205,82 +392,536 @@ async def create_supplies_category():
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Add GZip compression for better performance
-app.add_middleware(GZipMiddleware, minimum_size=1000)
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# In-memory cache for performance
-cache = {}
+# In-memory response cache for performance - bounded for Raspberry Pi (512M)
 CACHE_DURATION = 300  # 5 minutes
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024))  # 16 MB
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2000))
+GZIP_MINIMUM_SIZE = 1000
+# Catalog responses are always revalidated; unchanged data costs a 304 without touching MongoDB
+CATALOG_CACHE_CONTROL = "private, no-cache"
+# Tag versions restart at 0 on every boot, so ETags also carry a per-process id
+ETAG_BOOT_ID = uuid.uuid4().hex[:8]
+
+# Cached GET routes and the collections (tags) their responses depend on
+CACHEABLE_ROUTES = {
+    "/api/products": ("products",),
+    "/api/products/count": ("products",),
+    "/api/products/page": ("products",),
+    "/api/products/favorites": ("products",),
+    "/api/products/supplies": ("products", "categories"),
+    "/api/companies": ("companies",),
+    "/api/categories": ("categories",),
+    "/api/category-groups": ("category_groups",),
+    "/api/packages": ("packages",),
+}
+
+class ResponseCache:
+    """LRU response cache with a byte budget and per-collection tag invalidation.
+
+    Every tag (collection) has a generation counter. Entries remember the
+    generations they were stored under, so invalidating a tag is a single
+    counter bump; stale entries are dropped lazily on lookup or by LRU eviction.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (value, size, stored_at, tags, versions)
+        self.tag_versions = {}  # tag -> generation counter
+        self.generation = 0  # bumped by clear()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def versions(self, tags) -> tuple:
+        """Current generation of each tag"""
+        return tuple(self.tag_versions.get(tag, 0) for tag in tags)
+
+    def etag(self, key: str, tags) -> str:
+        """Strong ETag derived from the current tag versions - no body needed"""
+        versions = ".".join(str(v) for v in self.versions(tags))
+        key_hash = hashlib.blake2b(key.encode(), digest_size=6).hexdigest()
+        return f'"{ETAG_BOOT_ID}-{self.generation}-{versions}-{key_hash}"'
+
+    def get(self, key: str):
+        """Return cached value or None (counts hit/miss)"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, size, stored_at, tags, versions = entry
+        if versions != self.versions(tags) or time.time() - stored_at >= self.ttl:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value, size: int, tags, versions: tuple = None) -> bool:
+        """Store value; versions should be captured before the data was read"""
+        if size > self.max_bytes:
+            return False
+        if versions is None:
+            versions = self.versions(tags)
+        elif versions != self.versions(tags):
+            # A write happened while the response was being built
+            return False
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (value, size, time.time(), tuple(tags), versions)
+        self.current_bytes += size
+        while self.entries and (self.current_bytes > self.max_bytes or len(self.entries) > self.max_entries):
+            oldest_key = next(iter(self.entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+        return True
+
+    def invalidate(self, *tags):
+        """Invalidate all entries depending on the given tags in O(1) per tag"""
+        for tag in tags:
+            self.tag_versions[tag] = self.tag_versions.get(tag, 0) + 1
+        self.invalidations += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.current_bytes = 0
+        self.generation += 1
+        self.invalidations += 1
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "tag_versions": dict(self.tag_versions)
+        }
+
+class CachedResponse(NamedTuple):
+    """Pre-serialized response body replayed on cache hits"""
+    body: bytes
+    gzip_body: Optional[bytes]  # None for small bodies (below GZip minimum size)
+    media_type: str
+    etag: str
+    cache_control: Optional[str]
+    extra_headers: Tuple[Tuple[bytes, bytes], ...] = ()  # raw CACHED_RESPONSE_HEADERS set by the endpoint
+
+    @classmethod
+    def from_body(cls, body: bytes, media_type: str, etag: str, cache_control: Optional[str] = None,
+                  extra_headers: Optional[List[Tuple[bytes, bytes]]] = None) -> "CachedResponse":
+        gzip_body = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MINIMUM_SIZE else None
+        return cls(body, gzip_body, media_type, etag, cache_control, tuple(extra_headers or ()))
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + (len(self.gzip_body) if self.gzip_body else 0)
+
+    def to_response(self, accept_encoding: str) -> Response:
+        headers = {"ETag": self.etag, "Vary": "Accept-Encoding"}
+        if self.cache_control:
+            headers["Cache-Control"] = self.cache_control
+        if self.gzip_body is not None and "gzip" in accept_encoding:
+            # GZipMiddleware leaves responses with Content-Encoding untouched
+            headers["Content-Encoding"] = "gzip"
+            response = Response(content=self.gzip_body, media_type=self.media_type, headers=headers)
+        else:
+            response = Response(content=self.body, media_type=self.media_type, headers=headers)
+        # Raw pairs so repeated header lines replay as they were sent
+        response.raw_headers.extend(self.extra_headers)
+        return response
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRIES, CACHE_DURATION)
+# Endpoint headers that are part of the cached response
+CACHED_RESPONSE_HEADERS = (b"x-next-cursor",)
 
 # Cache middleware
 @app.middleware("http")
 async def cache_middleware(request: Request, call_next):
-    """Simple in-memory cache middleware for GET requests"""
+    """Bounded in-memory cache middleware for GET requests.
+    
+    Stores the raw JSON bytes produced by the endpoint (plus a gzip variant),
+    so a hit is a dictionary lookup and a socket write. Conditional GETs whose
+    If-None-Match matches a live (unexpired, current) cache entry get a 304 directly,
+    so CACHE_DURATION also bounds how long clients keep data written outside the API.
+    """
     start_time = time.time()
     
     # Only cache GET requests to specific endpoints
-    if request.method == "GET" and any(path in str(request.url) for path in ["/api/products", "/api/companies", "/api/categories"]):
-        cache_key = str(request.url)
+    cache_tags = CACHEABLE_ROUTES.get(request.url.path) if request.method == "GET" else None
+    if cache_tags:
+        cache_key = f"{request.url.path}?{request.url.query}"
+        etag = response_cache.etag(cache_key, cache_tags)
         
         # Check cache
-        if cache_key in cache:
-            cached_data, timestamp = cache[cache_key]
-            if time.time() - timestamp < CACHE_DURATION:
-                logger.info(f"Cache HIT for {cache_key}")
-                response = JSONResponse(content=cached_data)
-                response.headers["X-Cache"] = "HIT"
-                response.headers["X-Response-Time"] = f"{(time.time() - start_time) * 1000:.2f}ms"
-                return response
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            # Conditional GET - nothing changed since the client's copy
+            if_none_match = request.headers.get("if-none-match")
+            if if_none_match and (if_none_match.strip() == "*" or
+                                  cached.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]):
+                return Response(status_code=304, headers={
+                    "ETag": cached.etag,
+                    "Cache-Control": CATALOG_CACHE_CONTROL,
+                    "Vary": "Accept-Encoding",
+                    "X-Cache": "NOT-MODIFIED",
+                    "X-Response-Time": f"{(time.time() - start_time) * 1000:.2f}ms"
+                })
+            logger.debug(f"Cache HIT for {cache_key}")
+            response = cached.to_response(request.headers.get("accept-encoding", ""))
+            response.headers["X-Cache"] = "HIT"
+            response.headers["X-Response-Time"] = f"{(time.time() - start_time) * 1000:.2f}ms"
+            return response
+        
+        # Snapshot tag versions before the handler reads from MongoDB
+        cache_versions = response_cache.versions(cache_tags)
     
     # Process request
     response = await call_next(request)
     
-    # Cache successful GET responses
-    if (request.method == "GET" and 
-        response.status_code == 200 and 
-        any(path in str(request.url) for path in ["/api/products", "/api/companies", "/api/categories"])):
-        
-        cache_key = str(request.url)
-        if hasattr(response, 'body'):
-            import json
-            try:
-                body = json.loads(response.body.decode())
-                cache[cache_key] = (body, time.time())
-                logger.info(f"Cache SET for {cache_key}")
-            except:
-                pass
+    # Cache successful JSON GET responses - call_next always returns a streaming
+    # response, so the body has to be buffered before it can be stored
+    if (cache_tags and response.status_code == 200 and
+            response.headers.get("content-type", "").startswith("application/json") and
+            "content-encoding" not in response.headers):
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        cached = CachedResponse.from_body(
+            body,
+            response.headers["content-type"],
+            etag,
+            CATALOG_CACHE_CONTROL,
+            [(name, value) for name, value in response.raw_headers if name in CACHED_RESPONSE_HEADERS]
+        )
+        if response_cache.set(cache_key, cached, cached.size, cache_tags, cache_versions):
+            logger.debug(f"Cache SET for {cache_key}")
+        
+        headers = MutableHeaders(raw=list(response.raw_headers))
+        headers["ETag"] = cached.etag
+        headers["Cache-Control"] = CATALOG_CACHE_CONTROL
+        headers["X-Cache"] = "MISS"
+        headers["Content-Length"] = str(len(body))
+        response = Response(
+            content=body,
+            status_code=response.status_code,
+            background=response.background
+        )
+        # Keep the raw list: a dict would collapse repeated headers such as Set-Cookie
+        response.raw_headers = headers.raw
     
     response.headers["X-Response-Time"] = f"{(time.time() - start_time) * 1000:.2f}ms"
     return response
 
+# Middleware order matters: the cache middleware above is registered first so it
+# runs inside CORS and GZip and only ever sees uncompressed response bodies.
+
+# Configure CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_credentials=True,
+    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
+
+# Already compressed; gzipping them again only costs CPU and drops Content-Length
+GZIP_EXCLUDED_MEDIA_TYPES = ("application/pdf",)
+
+class SelectiveGZipResponder(GZipResponder):
+    """GZipResponder that passes GZIP_EXCLUDED_MEDIA_TYPES responses through untouched"""
+
+    async def send_with_gzip(self, message):
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith(GZIP_EXCLUDED_MEDIA_TYPES):
+                self.content_encoding_set = True  # body messages are forwarded as they are
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves PDFs (streamed FileResponses) uncompressed"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = SelectiveGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+# Add GZip compression for better performance
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
 # Cache invalidation utility
-def invalidate_cache(pattern: str = None):
-    """Invalidate cache entries matching pattern"""
-    if pattern is None:
-        cache.clear()
+def invalidate_cache(*tags: str):
+    """Invalidate cached responses for the given collection tags (all if none given)"""
+    if not tags:
+        response_cache.clear()
+        product_count_cache.clear()
         logger.info("All cache cleared")
     else:
-        keys_to_remove = [key for key in cache.keys() if pattern in key]
-        for key in keys_to_remove:
-            del cache[key]
-        logger.info(f"Cache cleared for pattern: {pattern}")
+        response_cache.invalidate(*tags)
+        logger.info(f"Cache invalidated for: {', '.join(tags)}")
+
+# Package hydration - shared by package detail and PDF endpoints
+PACKAGE_HYDRATION_TAGS = ("packages", "products", "categories", "category_groups")
+PACKAGE_HYDRATION_CACHE_SIZE = 32
+
+class HydratedPackage(NamedTuple):
+    """A package and everything needed to render it"""
+    package: Dict[str, Any]
+    package_products: tuple
+    package_supplies: tuple
+    products_by_id: Dict[str, Dict[str, Any]]  # products and supplies referenced by the package
+    categories: tuple  # empty unless loaded with_categories
+    category_groups: tuple
+
+# (package_id, with_categories) -> (tag versions, HydratedPackage); memoized per package version
+hydrated_packages = OrderedDict()
+
+async def hydrate_package(package_id: str, with_categories: bool = False) -> Optional[HydratedPackage]:
+    """Load a package with its products and supplies in two round trips
+    
+    with_categories also loads all categories and groups (for the PDFs). Every
+    call gets its own copy of the memoized data, so callers may modify it.
+    """
+    memo_key = (package_id, with_categories)
+    versions = (response_cache.generation, response_cache.versions(PACKAGE_HYDRATION_TAGS))
+    memoized = hydrated_packages.get(memo_key)
+    if memoized is not None and memoized[0] == versions:
+        hydrated_packages.move_to_end(memo_key)
+        return copy.deepcopy(memoized[1])
+    
+    async def find_all(collection):
+        return await collection.find().to_list(None) if with_categories else []
+    
+    package, package_products, package_supplies, categories, category_groups = await asyncio.gather(
+        db.packages.find_one({"id": package_id}),
+        db.package_products.find({"package_id": package_id}).to_list(None),
+        db.package_supplies.find({"package_id": package_id}).to_list(None),
+        find_all(db.categories),
+        find_all(db.category_groups)
+    )
+    if not package:
+        return None
+    
+    # Single $in query instead of one find_one per line item
+    product_ids = list({item["product_id"] for item in package_products + package_supplies})
+    products = await db.products.find({"id": {"$in": product_ids}}).to_list(None) if product_ids else []
+    
+    hydrated = HydratedPackage(
+        package=package,
+        package_products=tuple(package_products),
+        package_supplies=tuple(package_supplies),
+        products_by_id={p["id"]: p for p in products},
+        categories=tuple(categories),
+        category_groups=tuple(category_groups)
+    )
+    # Only memoize if nothing was written while we were reading
+    if versions == (response_cache.generation, response_cache.versions(PACKAGE_HYDRATION_TAGS)):
+        hydrated_packages[memo_key] = (versions, copy.deepcopy(hydrated))
+        hydrated_packages.move_to_end(memo_key)
+        while len(hydrated_packages) > PACKAGE_HYDRATION_CACHE_SIZE:
+            hydrated_packages.popitem(last=False)
+    return hydrated
 
 # Thread pool for CPU intensive tasks
 thread_pool = ThreadPoolExecutor(max_workers=4)
 
+class WorkerPoolBusyError(Exception):
+    """Raised when a worker pool's queue is full"""
+
+class WorkerPool:
+    """Bounded process pool for CPU-bound work that must not block the event loop.
+
+    The process pool is created lazily (spawn context, so children never inherit
+    the Motor client or event loop). With max_workers=0 jobs run on thread_pool
+    instead, which keeps memory low on the Pi at the cost of GIL contention.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_concurrency: int, max_queue: int,
+                 timeout: float, initializer=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.initializer = initializer
+        self._executor = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    def _get_executor(self):
+        if self.max_workers <= 0:
+            return thread_pool
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer
+            )
+            logger.info(f"{self.name} worker pool started with {self.max_workers} processes")
+        return self._executor
+
+    def _release(self, _future):
+        self.active -= 1
+        self._semaphore.release()
+
+    async def run(self, func, *args, cleanup=None):
+        """Run func(*args) in the pool; raises WorkerPoolBusyError or asyncio.TimeoutError
+        
+        cleanup() is called when a job the caller stopped waiting for (timeout or
+        cancellation) finally finishes, e.g. to delete the file it was writing.
+        """
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise WorkerPoolBusyError(f"{self.name} queue is full ({self.queued} waiting)")
+        
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        
+        self.active += 1
+        start_time = time.time()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        except Exception:
+            self._release(None)
+            raise
+        # The slot is only freed when the job really finishes, even after a timeout
+        future.add_done_callback(self._release)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"{self.name} job timed out after {self.timeout}s")
+            raise
+        except BrokenProcessPool:
+            self.failed += 1
+            self._executor = None  # A worker died; start a fresh pool next time
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.total_seconds += time.time() - start_time
+            if cleanup is not None and not future.done():
+                future.add_done_callback(lambda _future: cleanup())
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed + self.timeouts
+        return {
+            "workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "timeout": self.timeout,
+            "started": self._executor is not None or self.max_workers <= 0,
+            "queued": self.queued,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "avg_seconds": round(self.total_seconds / finished, 3) if finished else 0
+        }
+
+# ReportLab rendering is CPU-bound, keep it off the event loop
+def warm_pdf_resources():
+    """Worker pool initializer - load fonts/styles/logo before the first job"""
+    get_pdf_resources()
+
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 1))
+pdf_worker_pool = WorkerPool(
+    "PDF",
+    max_workers=PDF_RENDER_WORKERS,
+    max_concurrency=int(os.environ.get('PDF_RENDER_CONCURRENCY', max(1, PDF_RENDER_WORKERS))),
+    max_queue=int(os.environ.get('PDF_RENDER_MAX_QUEUE', 8)),
+    timeout=float(os.environ.get('PDF_RENDER_TIMEOUT', 60)),
+    initializer=warm_pdf_resources
+)
+
+class ExcelParseBudgetError(Exception):
+    """Raised inside an Excel worker when a file exceeds its CPU budget"""
+
+def _excel_cpu_budget_exceeded(signum, frame):
+    raise ExcelParseBudgetError("Excel dosyası işlem süresi sınırını aştı")
+
+def init_excel_worker():
+    """Worker pool initializer - turn SIGXCPU into an exception instead of killing the worker"""
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _excel_cpu_budget_exceeded)
+
+@contextmanager
+def cpu_budget(seconds: float):
+    """Limit the CPU time the current worker process may spend on one job.
+    
+    RLIMIT_CPU counts the whole process lifetime, so the soft limit is set to
+    current usage + budget and restored afterwards. Only active inside Excel
+    worker processes (never in the API process or in threads).
+    """
+    if (resource is None or seconds <= 0 or
+            threading.current_thread() is not threading.main_thread() or
+            signal.getsignal(signal.SIGXCPU) is not _excel_cpu_budget_exceeded):
+        yield
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    limit = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+# openpyxl parsing with full styles is CPU-bound, keep it off the event loop
+EXCEL_PARSE_WORKERS = int(os.environ.get('EXCEL_PARSE_WORKERS', 1))
+EXCEL_PARSE_CPU_BUDGET = float(os.environ.get('EXCEL_PARSE_CPU_BUDGET', 120))  # CPU seconds per file
+excel_worker_pool = WorkerPool(
+    "Excel",
+    max_workers=EXCEL_PARSE_WORKERS,
+    max_concurrency=max(1, EXCEL_PARSE_WORKERS),
+    max_queue=int(os.environ.get('EXCEL_PARSE_MAX_QUEUE', 16)),
+    timeout=float(os.environ.get('EXCEL_PARSE_TIMEOUT', 180)),
+    initializer=init_excel_worker
+)
+worker_pools = [pdf_worker_pool, excel_worker_pool]
+
 # Pydantic Models
 class Company(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -307,6 +948,38 @@ class Product(BaseModel):
     stock_quantity: Optional[int] = None  # Sadece favori ürünler için stok takibi
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ProductSummary(BaseModel):
+    """Product list item for view/fields requests; only the projected fields are returned"""
+    id: str
+    name: Optional[str] = None
+    company_id: Optional[str] = None
+    category_id: Optional[str] = None
+    brand: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    list_price: Optional[Decimal] = None
+    discounted_price: Optional[Decimal] = None
+    currency: Optional[str] = None
+    list_price_try: Optional[Decimal] = None
+    discounted_price_try: Optional[Decimal] = None
+    is_favorite: Optional[bool] = None
+    stock_quantity: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+# Field profiles for product lists (?view=); pickers don't need descriptions, images or timestamps
+PRODUCT_LIST_VIEWS = {
+    "full": None,
+    "picker": ("id", "name", "brand", "company_id", "category_id", "currency", "list_price", "discounted_price",
+               "list_price_try", "discounted_price_try", "is_favorite"),
+}
+
+class ProductPage(BaseModel):
+    products: Union[List[Product], List[ProductSummary]]
+    total: int  # Products matching the filters, across all pages
+    page: int
+    limit: int
+    next_cursor: Optional[str] = None
+
 class ProductCreate(BaseModel):
     name: str
     company_id: str
@@ -401,6 +1074,8 @@ class UploadHistory(BaseModel):
     total_products: int
     new_products: int
     updated_products: int
+    unchanged_products: int = 0
+    missing_products: int = 0
     currency_distribution: Dict[str, int]  # Currency -> count
     price_changes: List[Dict[str, Any]] = []  # Price change details
     status: str = "completed"  # completed, failed, processing
@@ -482,6 +1157,8 @@ class UploadHistoryResponse(BaseModel):
     total_products: int
     new_products: int
     updated_products: int
+    unchanged_products: int = 0
+    missing_products: int = 0
     currency_distribution: Dict[str, int]
     price_changes: List[Dict[str, Any]]
     status: str
@@ -733,6 +1410,31 @@ class CurrencyService:
         logger.warning(f"Using default fallback exchange rates: {default_rates}")
         return default_rates
     
+    async def snapshot_rates(self) -> Dict[str, Any]:
+        """Freeze the current rate table so a whole import converts with the same rates"""
+        rates = dict(await self.get_exchange_rates())
+        table = json.dumps(sorted((currency, str(rate)) for currency, rate in rates.items()))
+        return {
+            "id": hashlib.sha256(table.encode()).hexdigest()[:16],
+            "rates": rates,
+            "taken_at": datetime.now(timezone.utc)
+        }
+    
+    @staticmethod
+    def convert_batch_to_try(amounts, currencies, snapshot: Dict[str, Any]) -> np.ndarray:
+        """Convert a vector of amounts to Turkish Lira with one rate snapshot
+        
+        float64 amounts (NaN for missing) are converted in one multiply; an object
+        array of Decimals (None for missing) keeps Decimal math.
+        """
+        codes, inverse = np.unique(np.char.upper(np.asarray(currencies, dtype=str)), return_inverse=True)
+        unit_rates = [Decimal('1') if code == 'TRY' else snapshot['rates'].get(code, Decimal('1')) for code in codes]
+        amounts = np.asarray(amounts)
+        if amounts.dtype == object:
+            row_rates = np.array(unit_rates, dtype=object)[inverse]
+            return np.array([None if amount is None else amount * rate for amount, rate in zip(amounts, row_rates)], dtype=object)
+        return amounts.astype(np.float64) * np.array(unit_rates, dtype=np.float64)[inverse]
+    
     async def convert_to_try(self, amount: Decimal, from_currency: str) -> Decimal:
         """Convert amount to Turkish Lira"""
         if from_currency.upper() == 'TRY':
@@ -896,148 +1598,159 @@ async def get_db():
     """Get database connection"""
     return db
 
+# Hücre dolgu rengi sınıflandırması. Tablolar sıralıdır: ilk eşleşen kategori kazanır.
+FILL_RGB_CATEGORIES = tuple(
+    (category, re.compile('|'.join(patterns)))
+    for category, patterns in (
+        ('RED', ('FFFF0000', 'FF0000', 'CC0000')),  # Kırmızı = Ürün Adı
+        ('BLUE', ('FF0070C0', '0070C0', '0000FF', '4472C4')),  # Mavi = Ürün Açıklaması
+        ('ORANGE', ('FFFFC000', 'FFF4B183', 'F4B183', 'FF7F00', 'FFA500',
+                    'FF8C00', 'FFFF9900', 'FF9900')),  # Turuncu = İndirimli Fiyat
+        ('YELLOW', ('FFFFFF00', 'FFFF00', 'FFC000')),  # Sarı = Marka
+        ('GREEN', ('FF00B050', '00B050', '00FF00', '008000')),  # Yeşil = Liste Fiyatı
+    )
+)
+# Excel theme color mappings (theme 9 hem yeşil hem turuncu olabilir, varsayılan turuncu)
+FILL_THEME_CATEGORIES = {2: 'RED', 4: 'BLUE', 5: 'YELLOW', 6: 'GREEN', 9: 'ORANGE', 7: 'ORANGE'}
+# Excel'in standart renk indeksleri (bu dosyalarda index 9 İNDİRİMLİ fiyat için kullanılıyor)
+FILL_INDEX_CATEGORIES = {
+    '10': 'RED', '3': 'RED',
+    '12': 'BLUE', '5': 'BLUE',
+    '13': 'YELLOW', '6': 'YELLOW',
+    '11': 'GREEN', '4': 'GREEN',
+    '46': 'ORANGE', '53': 'ORANGE', '9': 'ORANGE',
+}
+
+
+def fill_color_key(fill) -> Optional[tuple]:
+    """(rgb, theme, index) triple identifying a cell fill color, None without a fill"""
+    if not fill or not hasattr(fill, 'start_color'):
+        return None
+    color = fill.start_color
+    rgb = str(color.rgb).upper() if getattr(color, 'rgb', None) else None
+    # openpyxl returns a descriptor placeholder instead of None for unset attributes
+    theme = getattr(color, 'theme', None)
+    if not isinstance(theme, int):
+        theme = None
+    index = getattr(color, 'index', None)
+    return rgb, theme, str(index) if index else None
+
+
+@lru_cache(maxsize=1024)
+def classify_fill_color(rgb: Optional[str], theme: Optional[int], index: Optional[str]) -> str:
+    """Map a fill color triple to RED/BLUE/ORANGE/YELLOW/GREEN/NONE"""
+    if rgb:
+        for category, pattern in FILL_RGB_CATEGORIES:
+            if pattern.search(rgb):
+                return category
+    if theme is not None and theme in FILL_THEME_CATEGORIES:
+        return FILL_THEME_CATEGORIES[theme]
+    if index:
+        return FILL_INDEX_CATEGORIES.get(index, 'NONE')
+    return 'NONE'
+
+
+def classify_row_fills(cells) -> List[str]:
+    """Classify the fill colors of a whole row of cells in one pass"""
+    categories = []
+    for cell in cells:
+        key = fill_color_key(getattr(cell, 'fill', None))
+        categories.append('NONE' if key is None else classify_fill_color(*key))
+    return categories
+
+
+# Renkli kolonlar ilk 15 sütunda, header ilk 20 satırda aranır
+COLORED_EXCEL_MAX_COLUMNS = 15
+COLORED_HEADER_SEARCH_ROWS = 20
+
+
+def excel_source(source):
+    """openpyxl/pandas input for an Excel file given as bytes or as a path on disk"""
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
 # Color-based Excel parsing service
 class ColorBasedExcelService:
     @staticmethod
     def detect_color_category(fill):
         """Detect color category from cell fill"""
-        if not fill or not hasattr(fill, 'start_color'):
+        key = fill_color_key(fill)
+        if key is None:
             return 'NONE'
-            
-        color = fill.start_color
-        
-        # RGB renk kontrolü
-        if hasattr(color, 'rgb') and color.rgb:
-            try:
-                rgb = str(color.rgb).upper()
-                
-                # Debug için
-                logger.debug(f"Checking RGB: {rgb}")
-                
-                # Kırmızı tonları (Ürün Adı) - FFFF0000 formatını kontrol et
-                if 'FFFF0000' in rgb or 'FF0000' in rgb or 'CC0000' in rgb:
-                    return 'RED'
-                # Mavi tonları (Ürün Açıklaması) - özel mavi tonları
-                elif 'FF0070C0' in rgb or '0070C0' in rgb or '0000FF' in rgb or '4472C4' in rgb:
-                    return 'BLUE'  
-                # Turuncu tonları (İndirimli Fiyat) - Önce daha spesifik kontroller
-                elif ('FFFFC000' in rgb or 'FFF4B183' in rgb or 'F4B183' in rgb or 'FF7F00' in rgb or 'FFA500' in rgb or 
-                      'FF8C00' in rgb or 'FFFF9900' in rgb or 'FF9900' in rgb):
-                    return 'ORANGE'
-                # Sarı tonları (Firma) - FFFFFF00 formatını kontrol et
-                elif 'FFFFFF00' in rgb or 'FFFF00' in rgb or 'FFC000' in rgb:
-                    return 'YELLOW'
-                # Yeşil tonları (Liste Fiyatı) - FF00B050 formatını kontrol et
-                elif 'FF00B050' in rgb or '00B050' in rgb or '00FF00' in rgb or '008000' in rgb:
-                    return 'GREEN'
-                    
-            except Exception as e:
-                logger.warning(f"RGB parsing error: {e}")
-                
-        # Theme color kontrolü (Excel'de theme color kullanıldığında)
-        if hasattr(color, 'theme') and color.theme is not None:
-            try:
-                theme = color.theme
-                logger.debug(f"Checking theme color: {theme}")
-                
-                # Excel theme color mappings
-                if theme == 2:  # Theme color 2 genelde koyu kırmızı
-                    return 'RED'
-                elif theme == 4:  # Theme color 4 genelde mavi
-                    return 'BLUE'  
-                elif theme == 5:  # Theme color 5 genelde sarı/accent
-                    return 'YELLOW'
-                elif theme == 6:  # Theme color 6 genelde yeşil
-                    return 'GREEN'
-                elif theme == 9:  # Theme color 9 - özel durum: hem yeşil hem turuncu olabilir
-                    return 'ORANGE'  # Varsayılan turuncu, ama yeşil de olabilir
-                elif theme == 7:  # Theme color 7 genelde turuncu
-                    return 'ORANGE'
-                    
-            except Exception as e:
-                logger.warning(f"Theme color parsing error: {e}")
-                
-        # Index renk kontrolü
-        if hasattr(color, 'index') and color.index:
-            try:
-                index = str(color.index)
-                logger.debug(f"Checking color index: {index}")
-                # Excel'in standart renk indeksleri
-                if index in ['10', '3']:  # Kırmızı
-                    return 'RED' 
-                elif index in ['12', '5']:  # Mavi
-                    return 'BLUE'
-                elif index in ['13', '6']:  # Sarı
-                    return 'YELLOW'
-                elif index in ['11', '4']:  # Yeşil
-                    return 'GREEN'
-                elif index in ['46', '53']:  # Turuncu
-                    return 'ORANGE'
-                elif index == '9':  # Bu dosyada index 9 İNDİRİMLİ fiyat için kullanılıyor
-                    return 'ORANGE'
-            except Exception as e:
-                logger.warning(f"Index parsing error: {e}")
-                
-        return 'NONE'
+        return classify_fill_color(*key)
     
     @staticmethod
-    def parse_colored_excel(file_content: bytes, company_name: str = "Unknown") -> List[Dict[str, Any]]:
-        """Parse Excel file using color-based column detection"""
+    def parse_colored_excel(file_content, company_name: str = "Unknown", sheet_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Parse Excel file using color-based column detection (optionally only some sheets)"""
+        try:
+            products = list(ColorBasedExcelService.iter_colored_products(file_content, company_name, sheet_names))
+            logger.info(f"Total products extracted: {len(products)}")
+            return products
+        except ExcelParseBudgetError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in color-based Excel parsing: {e}")
+            raise HTTPException(status_code=400, detail=f"Renkli Excel dosyası işlenemedi: {str(e)}")
+    
+    @staticmethod
+    def iter_colored_products(source, company_name: str = "Unknown", sheet_names: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Stream products from an Excel file (bytes or path) with color-based column detection.
+        
+        The workbook is opened read-only and every sheet is read in a single
+        forward pass, so memory stays flat regardless of the row count.
+        """
+        # Load workbook with data_only=True to get formula results
+        workbook = openpyxl.load_workbook(excel_source(source), read_only=True, data_only=True)
         try:
-            # Load workbook with data_only=True to get formula results
-            workbook = openpyxl.load_workbook(io.BytesIO(file_content), data_only=True)
-            all_products = []
-            
             logger.info(f"Processing Excel with {len(workbook.sheetnames)} sheets: {workbook.sheetnames}")
             
-            for sheet_name in workbook.sheetnames:
+            for sheet_name in (sheet_names or workbook.sheetnames):
                 logger.info(f"Processing sheet: {sheet_name}")
-                sheet = workbook[sheet_name]
+                # Renkli kolonlar ilk 15 sütundan belirlenir, daha fazlası okunmaz
+                rows = workbook[sheet_name].iter_rows(max_col=COLORED_EXCEL_MAX_COLUMNS)
+                head = list(itertools.islice(rows, COLORED_HEADER_SEARCH_ROWS))
                 
                 # Find header row by looking for colored cells
-                header_row = ColorBasedExcelService._find_colored_header_row(sheet)
+                header_row = ColorBasedExcelService._find_colored_header_row(head)
                 if header_row == -1:
                     logger.warning(f"No header found in sheet {sheet_name}, trying to analyze first row as data")
                     # Header yoksa direkt 0. satırı data olarak kabul et ve renkleri analiz et
-                    column_mapping = ColorBasedExcelService._analyze_data_row_colors(sheet, 0)
+                    column_mapping = ColorBasedExcelService._analyze_data_row_colors(head[0] if head else ())
                     if all(val == -1 for val in column_mapping.values()):
                         logger.warning(f"No colored columns found in {sheet_name}, skipping")
                         continue
-                    header_row = -1  # Data başlangıcı için -1 kullan
                 else:
                     logger.info(f"Found colored header at row {header_row + 1}")
                     # Analyze header colors to map columns
-                    column_mapping = ColorBasedExcelService._analyze_header_colors(sheet, header_row)
+                    column_mapping = ColorBasedExcelService._analyze_header_colors(head[header_row])
                 
                 logger.info(f"Column mapping: {column_mapping}")
                 
-                # Extract products from this sheet
-                sheet_products = ColorBasedExcelService._extract_products_from_sheet(
-                    sheet, header_row, column_mapping, company_name
-                )
+                # Start row: header varsa header_row + 1, yoksa 0
+                start_row = header_row + 1
+                sheet_products = 0
+                for product in ColorBasedExcelService._extract_products_from_rows(
+                    itertools.chain(head[start_row:], rows), start_row, column_mapping, company_name
+                ):
+                    sheet_products += 1
+                    yield product
                 
-                logger.info(f"Extracted {len(sheet_products)} products from {sheet_name}")
-                all_products.extend(sheet_products)
-            
-            logger.info(f"Total products extracted: {len(all_products)}")
-            return all_products
-            
-        except Exception as e:
-            logger.error(f"Error in color-based Excel parsing: {e}")
-            raise HTTPException(status_code=400, detail=f"Renkli Excel dosyası işlenemedi: {str(e)}")
+                logger.info(f"Extracted {sheet_products} products from {sheet_name}")
+        finally:
+            workbook.close()
     
     @staticmethod
-    def _find_colored_header_row(sheet) -> int:
-        """Find the header row with colored cells"""
-        max_search_rows = min(20, sheet.max_row)
+    def _find_colored_header_row(rows) -> int:
+        """Find the header row with colored cells among the first rows of a sheet"""
+        rows = [row[:10] for row in rows]
         
-        for row_idx in range(max_search_rows):
+        for row_idx, row in enumerate(rows):
             colored_cells = 0
             non_empty_cells = 0
             meaningful_cells = 0
+            categories = classify_row_fills(row)
             
-            for col_idx in range(min(10, sheet.max_column)):
-                cell = sheet.cell(row=row_idx + 1, column=col_idx + 1)
+            for cell, color_category in zip(row, categories):
                 if cell.value and str(cell.value).strip():
                     cell_text = str(cell.value).strip().lower()
                     non_empty_cells += 1
@@ -1046,8 +1759,6 @@ class ColorBasedExcelService:
                     if any(word in cell_text for word in ['ürün', 'ad', 'açık', 'marka', 'firma', 'fiyat', 'price', 'name']):
                         meaningful_cells += 1
                     
-                    color_category = ColorBasedExcelService.detect_color_category(cell.fill)
-                    logger.debug(f"Row {row_idx + 1}, Col {col_idx + 1}: '{cell_text}' -> {color_category}")
                     if color_category != 'NONE':
                         colored_cells += 1
             
@@ -1058,10 +1769,9 @@ class ColorBasedExcelService:
                 return row_idx
         
         # Fallback: Anlamlı kelimeler içeren satırı bul
-        for row_idx in range(max_search_rows):
+        for row_idx, row in enumerate(rows):
             meaningful_cells = 0
-            for col_idx in range(min(10, sheet.max_column)):
-                cell = sheet.cell(row=row_idx + 1, column=col_idx + 1)
+            for cell in row:
                 if cell.value:
                     cell_text = str(cell.value).strip().lower()
                     if any(word in cell_text for word in ['ürün', 'ad', 'açık', 'marka', 'firma', 'fiyat']):
@@ -1100,7 +1810,7 @@ class ColorBasedExcelService:
             return 'TRY'
 
     @staticmethod
-    def _analyze_header_colors(sheet, header_row: int) -> Dict[str, int]:
+    def _analyze_header_colors(row) -> Dict[str, int]:
         """Analyze header colors and map to column purposes - ONLY COLOR-BASED"""
         column_mapping = {
             'product_name': -1,
@@ -1112,12 +1822,9 @@ class ColorBasedExcelService:
             'currency': 'TRY'  # Varsayılan döviz
         }
         
-        for col_idx in range(min(15, sheet.max_column)):
-            cell = sheet.cell(row=header_row + 1, column=col_idx + 1)
+        for col_idx, (cell, color_category) in enumerate(zip(row, classify_row_fills(row))):
             if not cell.value:
                 continue
-                
-            color_category = ColorBasedExcelService.detect_color_category(cell.fill)
             
             # SADECE renk kategorilerine göre kolon belirleme - text-based fallback YOK
             if color_category == 'RED':  # Kırmızı = Ürün Adı
@@ -1139,7 +1846,7 @@ class ColorBasedExcelService:
         return column_mapping
     
     @staticmethod
-    def _analyze_data_row_colors(sheet, data_row: int) -> Dict[str, int]:
+    def _analyze_data_row_colors(row) -> Dict[str, int]:
         """Analyze first data row colors when no header is found - ONLY COLOR-BASED"""
         column_mapping = {
             'product_name': -1,
@@ -1151,12 +1858,9 @@ class ColorBasedExcelService:
             'currency': 'TRY'  # Header yoksa varsayılan TRY
         }
         
-        for col_idx in range(min(15, sheet.max_column)):
-            cell = sheet.cell(row=data_row + 1, column=col_idx + 1)
+        for col_idx, (cell, color_category) in enumerate(zip(row, classify_row_fills(row))):
             if not cell.value:
                 continue
-                
-            color_category = ColorBasedExcelService.detect_color_category(cell.fill)
             
             # SADECE renk kategorilerine göre kolon belirleme - text-based fallback YOK
             if color_category == 'RED':  # Kırmızı = Ürün Adı
@@ -1176,17 +1880,13 @@ class ColorBasedExcelService:
         return column_mapping
     
     @staticmethod
-    def _extract_products_from_sheet(sheet, header_row: int, column_mapping: Dict[str, int], company_name: str) -> List[Dict[str, Any]]:
-        """Extract products from a sheet using column mapping"""
+    def _extract_products_from_rows(rows, start_row: int, column_mapping: Dict[str, int], company_name: str) -> Iterator[Dict[str, Any]]:
+        """Yield products from the data rows of a sheet using column mapping"""
         import random
-        products = []
         
-        # Start row hesaplama: header varsa header_row + 1, yoksa 0
-        start_row = 0 if header_row == -1 else header_row + 1
-        
-        # Start from the appropriate row
-        for row_idx in range(start_row, sheet.max_row):
+        for row_idx, row in enumerate(rows, start=start_row):
             try:
+                categories = classify_row_fills(row)
                 # Extract data based on column mapping
                 product_name = ""
                 description = ""
@@ -1197,23 +1897,23 @@ class ColorBasedExcelService:
                 
                 # Ürün adı (Kırmızı) - SADECE kırmızı hücre kabul edilir
                 if column_mapping['product_name'] >= 0:
-                    name_cell = sheet.cell(row=row_idx + 1, column=column_mapping['product_name'] + 1)
+                    name_cell = row[column_mapping['product_name']]
                     if (name_cell.value and 
-                        ColorBasedExcelService.detect_color_category(name_cell.fill) == 'RED'):
+                        categories[column_mapping['product_name']] == 'RED'):
                         product_name = str(name_cell.value).strip()
 
                 # Açıklama (Mavi) - SADECE mavi hücre kabul edilir
                 if column_mapping['description'] >= 0:
-                    desc_cell = sheet.cell(row=row_idx + 1, column=column_mapping['description'] + 1)
+                    desc_cell = row[column_mapping['description']]
                     if (desc_cell.value and 
-                        ColorBasedExcelService.detect_color_category(desc_cell.fill) == 'BLUE'):
+                        categories[column_mapping['description']] == 'BLUE'):
                         description = str(desc_cell.value).strip()
 
                 # Marka (Sarı) - SADECE sarı hücre kabul edilir
                 if column_mapping['brand'] >= 0:
-                    brand_cell = sheet.cell(row=row_idx + 1, column=column_mapping['brand'] + 1)
+                    brand_cell = row[column_mapping['brand']]
                     if (brand_cell.value and 
-                        ColorBasedExcelService.detect_color_category(brand_cell.fill) == 'YELLOW'):
+                        categories[column_mapping['brand']] == 'YELLOW'):
                         brand_value = str(brand_cell.value).strip()
                         # Excel formülü değilse VE sayısal değer değilse kullan
                         if not brand_value.startswith('='):
@@ -1228,9 +1928,9 @@ class ColorBasedExcelService:
 
                 # Liste Fiyatı (Yeşil) - SADECE yeşil hücre kabul edilir
                 if column_mapping['list_price'] >= 0:
-                    price_cell = sheet.cell(row=row_idx + 1, column=column_mapping['list_price'] + 1)
+                    price_cell = row[column_mapping['list_price']]
                     if (price_cell.value and 
-                        ColorBasedExcelService.detect_color_category(price_cell.fill) == 'GREEN'):
+                        categories[column_mapping['list_price']] == 'GREEN'):
                         try:
                             list_price = float(str(price_cell.value).replace(',', '.'))
                         except:
@@ -1238,9 +1938,9 @@ class ColorBasedExcelService:
 
                 # İndirimli Fiyat (Turuncu) - SADECE turuncu hücre kabul edilir
                 if column_mapping['discounted_price'] >= 0:
-                    disc_price_cell = sheet.cell(row=row_idx + 1, column=column_mapping['discounted_price'] + 1)
+                    disc_price_cell = row[column_mapping['discounted_price']]
                     if (disc_price_cell.value and 
-                        ColorBasedExcelService.detect_color_category(disc_price_cell.fill) == 'ORANGE'):
+                        categories[column_mapping['discounted_price']] == 'ORANGE'):
                         try:
                             discounted_price = float(str(disc_price_cell.value).replace(',', '.'))
                         except:
@@ -1258,7 +1958,7 @@ class ColorBasedExcelService:
                     list_price > 0 and 
                     not any(skip_word in product_name.lower() for skip_word in ['no', 'resim', 'ürün adı', 'toplam'])):
                     
-                    products.append({
+                    yield {
                         'name': product_name,
                         'description': description if description else None,
                         'brand': brand if brand else "",  # Yeni: marka alanı
@@ -1266,22 +1966,39 @@ class ColorBasedExcelService:
                         'list_price': list_price,
                         'discounted_price': discounted_price if discounted_price and discounted_price > 0 else None,
                         'currency': column_mapping.get('currency', 'TRY')  # Algılanan dövizi kullan
-                    })
+                    }
                     
             except Exception as e:
                 logger.warning(f"Error processing row {row_idx + 1}: {e}")
                 continue
-        
-        return products
+
+# Para birimi anahtar kelimeleri, kontrol sırasıyla (ilk eşleşen kazanır)
+CURRENCY_KEYWORDS = (
+    ('USD', ('$', 'DOLAR', 'DOLLAR', 'USD', 'DOLAR İSARETİ', 'DOLAR IŞARETI', 'AMERİKAN DOLARI', 'AMERIKAN DOLARI')),
+    ('EUR', ('€', 'EURO', 'EUR', 'AVRO', 'AVRUPA')),
+    ('TRY', ('₺', 'TL', 'TRY', 'TÜRK', 'LIRA', 'TÜRK LİRASI', 'TURK LIRASI', 'TURKİYE', 'TURKIYE')),
+)
+CURRENCY_PATTERNS = tuple(
+    (currency, '|'.join(re.escape(keyword) for keyword in keywords))
+    for currency, keywords in CURRENCY_KEYWORDS
+)
 
 # Excel parsing service
 class ExcelService:
+    # Satır bazlı (renksiz) formatlar
+    FORMATS = ('headerless', 'elektrozirve', 'havensis', 'general')
+    
+    @staticmethod
+    def parse_excel_file(file_content, format_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Parse Excel file (bytes or path) and extract product data"""
+        return ExcelService.parse_excel_file_with_format(file_content, format_name)[1]
+    
     @staticmethod
-    def parse_excel_file(file_content: bytes) -> List[Dict[str, Any]]:
-        """Parse Excel file and extract product data"""
+    def parse_excel_file_with_format(file_content, format_name: Optional[str] = None) -> tuple:
+        """Parse Excel file and return (format name, products); format_name skips format detection"""
         try:
             # Read Excel file
-            df = pd.read_excel(io.BytesIO(file_content))
+            df = pd.read_excel(excel_source(file_content))
             
             logger.info(f"Excel file loaded: {len(df)} rows, {len(df.columns)} columns")
             
@@ -1289,16 +2006,23 @@ class ExcelService:
             header_row = ExcelService._find_header_row(df)
             logger.info(f"Header row found at index: {header_row}")
             
-            if header_row == -1:
+            if format_name is None:
+                format_name = 'headerless' if header_row == -1 else ExcelService.detect_dataframe_format(df)
+            elif (format_name == 'headerless') != (header_row == -1):
+                raise ValueError(f"File does not match the {format_name} format")
+            
+            if format_name == 'headerless':
                 # Header bulunamazsa tüm kolonları kontrol et
                 products = ExcelService._parse_without_header(df)
             else:
                 # Header bulunduysa o satırdan itibaren parse et
-                products = ExcelService._parse_with_header(df, header_row)
+                products = ExcelService._parse_with_header(df, header_row, format_name)
             
             logger.info(f"Total products extracted: {len(products)}")
-            return products
+            return format_name, products
             
+        except ExcelParseBudgetError:
+            raise
         except Exception as e:
             logger.error(f"Error parsing Excel file: {e}")
             raise HTTPException(status_code=400, detail=f"Excel dosyası işlenemedi: {str(e)}")
@@ -1335,14 +2059,14 @@ class ExcelService:
         return -1
     
     @staticmethod
-    def _parse_with_header(df, header_row: int) -> List[Dict[str, Any]]:
+    def _parse_with_header(df, header_row: int, format_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """Header'lı Excel dosyasını parse et"""
         # Header satırını kullanarak kolonları yeniden adlandır
         df_data = df.iloc[header_row:].copy()
         df_data.columns = df.iloc[header_row]
         df_data = df_data.iloc[1:]  # Header satırını atla
         
-        return ExcelService._extract_products_from_dataframe(df_data)
+        return ExcelService._extract_products_from_dataframe(df_data, format_name)
     
     @staticmethod
     def _parse_without_header(df) -> List[Dict[str, Any]]:
@@ -1400,118 +2124,138 @@ class ExcelService:
         return products
     
     @staticmethod
-    def _extract_products_from_dataframe(df) -> List[Dict[str, Any]]:
+    def detect_dataframe_format(df) -> str:
+        """Pick the row-based format from the column count"""
+        # ELEKTROZİRVE formatı (basit 4 kolon)
+        if len(df.columns) == 4:
+            return 'elektrozirve'
+        # HAVENSİS formatı (karmaşık multi-column)
+        elif len(df.columns) > 10:
+            return 'havensis'
+        # Genel format
+        return 'general'
+    
+    @staticmethod
+    def _extract_products_from_dataframe(df, format_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """DataFrame'den ürün verilerini çıkar"""
-        products = []
+        format_name = format_name or ExcelService.detect_dataframe_format(df)
         
-        # ELEKTROZİRVE formatını kontrol et (basit 4 kolon)
-        if len(df.columns) == 4:
+        if format_name == 'elektrozirve':
             logger.info("Detected ELEKTROZİRVE format (4 columns)")
             return ExcelService._parse_elektrozirve_format(df)
         
-        # HAVENSİS formatını kontrol et (karmaşık multi-column)
-        elif len(df.columns) > 10:
+        elif format_name == 'havensis':
             logger.info("Detected HAVENSİS format (multi-column)")
             return ExcelService._parse_havensis_format(df)
         
-        # Genel format parsing
         else:
             logger.info("Using general format parsing")
             return ExcelService._parse_general_format(df)
     
+    @staticmethod
+    def _float_cells(values: np.ndarray):
+        """float() of a column of cells, vectorized.
+        
+        Returns (numbers, notna, failed): numbers is NaN for empty cells and
+        failed marks non-empty cells float() rejects, like the old row loops.
+        """
+        notna = pd.notna(values)
+        if values.dtype.kind in 'biuf':
+            return values.astype(float), notna, np.zeros(len(values), dtype=bool)
+        numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+        failed = np.zeros(len(values), dtype=bool)
+        # to_numeric is stricter than float() ('1_000', non-ASCII digits, 'nan'); retry only those cells
+        for index in np.flatnonzero(notna & np.isnan(numbers)):
+            try:
+                numbers[index] = float(values[index])
+            except Exception:
+                failed[index] = True
+        return numbers, notna, failed
+    
+    @staticmethod
+    def _text_cells(values: np.ndarray) -> pd.Series:
+        """str(cell).strip() of a column of cells, "" for empty cells"""
+        text = pd.Series(values, dtype=object).astype(str).str.strip()
+        return text.where(pd.notna(values), "")
+    
     @staticmethod
     def _parse_elektrozirve_format(df) -> List[Dict[str, Any]]:
         """ELEKTROZİRVE formatında Excel parse et"""
-        products = []
-        
         # İlk satır header (Güneş Panelleri, LİSTE FİYATI, İskonto, Net Fiyat)
         df.columns = ['product_name', 'list_price', 'discount_rate', 'net_price']
+        # iterrows gibi satırların ortak dtype'ı ile oku
+        values = df.to_numpy()
+        
+        product_names = ExcelService._text_cells(values[:, 0])
+        list_prices, list_notna, list_failed = ExcelService._float_cells(values[:, 1])
+        net_prices, net_notna, net_failed = ExcelService._float_cells(values[:, 3])
+        list_prices = np.where(list_notna, list_prices, 0.0)
+        # Boş net fiyat eskiden olduğu gibi 0 olarak kalır
+        net_prices = np.where(net_notna, net_prices.astype(object), 0)
+        
+        failed = list_failed | net_failed
+        if failed.any():
+            logger.warning(f"Skipped {int(failed.sum())} ELEKTROZİRVE rows with unreadable prices")
+        
+        # Geçerli ürün kontrolü - fiyatsız kategori başlıkları (örn: "Esnek Güneş Panelleri") de elenir
+        valid = (
+            (df.index != 0)  # Header satırını atla
+            & ~failed
+            & (product_names.str.len() > 5).to_numpy()
+            & (list_prices > 0)
+            & ~product_names.str.lower().str.startswith('liste').to_numpy()
+        )
         
-        for index, row in df.iterrows():
-            try:
-                if index == 0:  # Header satırını atla
-                    continue
-                
-                product_name = str(row['product_name']).strip() if pd.notna(row['product_name']) else ""
-                list_price = float(row['list_price']) if pd.notna(row['list_price']) else 0
-                net_price = float(row['net_price']) if pd.notna(row['net_price']) else 0
-                
-                # Kategori başlıkları atla (örn: "Esnek Güneş Panelleri")
-                if ('panelleri' in product_name.lower() or 'aküler' in product_name.lower() or 
-                    'regülatörler' in product_name.lower()) and list_price == 0:
-                    continue
-                
-                # Geçerli ürün kontrolü
-                if (product_name and len(product_name) > 5 and 
-                    list_price > 0 and not product_name.lower().startswith('liste')):
-                    
-                    products.append({
-                        'name': product_name,
-                        'list_price': list_price,
-                        'currency': 'TRY',  # ELEKTROZİRVE TL fiyatları
-                        'discounted_price': net_price if net_price != list_price else None
-                    })
-                    logger.info(f"Added ELEKTROZİRVE product: {product_name[:50]}... - {list_price} TL")
-                    
-            except Exception as e:
-                logger.warning(f"Error processing ELEKTROZİRVE row {index}: {e}")
-                continue
-        
+        products = [
+            {
+                'name': product_name,
+                'list_price': list_price,
+                'currency': 'TRY',  # ELEKTROZİRVE TL fiyatları
+                'discounted_price': net_price if net_price != list_price else None
+            }
+            for product_name, list_price, net_price in zip(
+                product_names[valid].tolist(), list_prices[valid].tolist(), net_prices[valid].tolist()
+            )
+        ]
+        logger.info(f"Added {len(products)} ELEKTROZİRVE products")
         return products
     
     @staticmethod
     def _parse_havensis_format(df) -> List[Dict[str, Any]]:
         """HAVENSİS formatında Excel parse et"""
-        products = []
-        
         # HAVENSİS formatı: Col3=Ürün, Col6=Fiyat$, Col7=İskonto, Col8=İskontolu Fiyat$
         product_col = 3
         price_col = 6
-        discount_rate_col = 7
         discounted_price_col = 8
+        # iterrows gibi satırların ortak dtype'ı ile oku
+        values = df.to_numpy()
+        
+        product_names = ExcelService._text_cells(values[:, product_col])
+        list_prices, list_notna, list_failed = ExcelService._float_cells(values[:, price_col])
+        list_prices = np.where(list_notna & ~list_failed, list_prices, 0.0)
+        discounted_prices, discounted_notna, discounted_failed = ExcelService._float_cells(values[:, discounted_price_col])
+        discounted_prices = np.where(discounted_notna & ~discounted_failed, discounted_prices.astype(object), None)
+        
+        # Geçerli ürün kontrolü
+        valid = (
+            (df.index >= 12)  # İlk 12 satır header/boş satırlar
+            & (product_names.str.len() > 10).to_numpy()
+            & (list_prices > 0)
+            & product_names.str.lower().str.contains('panel', regex=False).to_numpy()
+        )
         
-        for index, row in df.iterrows():
-            try:
-                if index < 12:  # İlk 12 satır header/boş satırlar
-                    continue
-                
-                # Ürün adı (Col3)
-                product_name = ""
-                if len(row) > product_col and pd.notna(row.iloc[product_col]):
-                    product_name = str(row.iloc[product_col]).strip()
-                
-                # Liste fiyatı (Col6)
-                list_price = 0
-                if len(row) > price_col and pd.notna(row.iloc[price_col]):
-                    try:
-                        list_price = float(row.iloc[price_col])
-                    except:
-                        list_price = 0
-                
-                # İndirimli fiyat (Col8)
-                discounted_price = None
-                if len(row) > discounted_price_col and pd.notna(row.iloc[discounted_price_col]):
-                    try:
-                        discounted_price = float(row.iloc[discounted_price_col])
-                    except:
-                        discounted_price = None
-                
-                # Geçerli ürün kontrolü
-                if (product_name and len(product_name) > 10 and 
-                    list_price > 0 and 'panel' in product_name.lower()):
-                    
-                    products.append({
-                        'name': product_name,
-                        'list_price': list_price,
-                        'currency': 'USD',  # HAVENSİS USD fiyatları
-                        'discounted_price': discounted_price
-                    })
-                    logger.info(f"Added HAVENSİS product: {product_name[:50]}... - ${list_price}")
-                    
-            except Exception as e:
-                logger.warning(f"Error processing HAVENSİS row {index}: {e}")
-                continue
-        
+        products = [
+            {
+                'name': product_name,
+                'list_price': list_price,
+                'currency': 'USD',  # HAVENSİS USD fiyatları
+                'discounted_price': discounted_price
+            }
+            for product_name, list_price, discounted_price in zip(
+                product_names[valid].tolist(), list_prices[valid].tolist(), discounted_prices[valid].tolist()
+            )
+        ]
+        logger.info(f"Added {len(products)} HAVENSİS products")
         return products
     
     @staticmethod
@@ -1522,22 +2266,22 @@ class ExcelService:
             
         text = str(text).upper().strip()
         
-        # Dolar kontrolü - gelişmiş
-        dollar_keywords = ['$', 'DOLAR', 'DOLLAR', 'USD', 'DOLAR İSARETİ', 'DOLAR IŞARETI', 'AMERİKAN DOLARI', 'AMERIKAN DOLARI']
-        if any(keyword in text for keyword in dollar_keywords):
-            return 'USD'
-        
-        # Euro kontrolü - gelişmiş
-        euro_keywords = ['€', 'EURO', 'EUR', 'AVRO', 'AVRUPA']
-        if any(keyword in text for keyword in euro_keywords):
-            return 'EUR'
-        
-        # TL kontrolü - gelişmiş
-        tl_keywords = ['₺', 'TL', 'TRY', 'TÜRK', 'LIRA', 'TÜRK LİRASI', 'TURK LIRASI', 'TURKİYE', 'TURKIYE']
-        if any(keyword in text for keyword in tl_keywords):
-            return 'TRY'
+        for currency, keywords in CURRENCY_KEYWORDS:
+            if any(keyword in text for keyword in keywords):
+                return currency
             
         return fallback_currency
+    
+    @staticmethod
+    def _detect_cell_currencies(values: np.ndarray) -> np.ndarray:
+        """detect_currency_from_text(cell, None) for a column of cells, vectorized"""
+        text = pd.Series(values, dtype=object).astype(str).str.upper()
+        notna = pd.notna(values)
+        currencies = np.full(len(values), None, dtype=object)
+        # Öncelik sırası USD > EUR > TRY: sondan başlayıp üzerine yaz
+        for currency, pattern in reversed(CURRENCY_PATTERNS):
+            currencies[notna & text.str.contains(pattern, regex=True).to_numpy()] = currency
+        return currencies
 
     @staticmethod
     def _parse_general_format(df) -> List[Dict[str, Any]]:
@@ -1611,77 +2355,66 @@ class ExcelService:
                     logger.info(f"Using first numeric column '{col}' as list_price")
                     break
         
-        # Ürünleri çıkar
-        for index, row in df.iterrows():
-            try:
-                # Ürün adı
-                product_name = ""
-                if 'product_name' in row:
-                    product_name = str(row['product_name']).strip() if pd.notna(row['product_name']) else ""
-                
-                # Marka (yeni)
-                brand = ""
-                if 'brand' in row and pd.notna(row['brand']):
-                    brand = str(row['brand']).strip()
-                
-                # Liste fiyatı
-                list_price = 0
-                if 'list_price' in row:
-                    try:
-                        list_price = float(row['list_price']) if pd.notna(row['list_price']) else 0
-                    except:
-                        list_price = 0
-                
-                # İndirimli fiyat
-                discounted_price = None
-                if 'discounted_price' in row and pd.notna(row['discounted_price']):
-                    try:
-                        discounted_price = float(row['discounted_price'])
-                    except:
-                        discounted_price = None
-                
-                # Para birimi algılama - gelişmiş
-                currency = "USD"  # varsayılan
-                
-                # Önce currency sütunu varsa onu kullan
-                if 'currency' in row and pd.notna(row['currency']):
-                    detected = ExcelService.detect_currency_from_text(str(row['currency']))
-                    if detected:
-                        currency = detected
-                
-                # Tüm sütunlarda para birimi işaretçilerini ara
-                for col_name, col_value in row.items():
-                    if pd.notna(col_value):
-                        cell_text = str(col_value)
-                        detected = ExcelService.detect_currency_from_text(cell_text, None)
-                        if detected:
-                            currency = detected
-                            break
-                
-                # Sütun başlıklarında da para birimi ara
-                for col_name in df.columns:
-                    detected = ExcelService.detect_currency_from_text(str(col_name), None)
-                    if detected:
-                        currency = detected
-                        break
-                
-                # Geçerli ürün kontrolü
-                if product_name and len(product_name) > 3 and list_price > 0:
-                    product = {
-                        'name': product_name,
-                        'brand': brand,  # Yeni: marka alanı
-                        'list_price': list_price,
-                        'currency': currency,
-                        'discounted_price': discounted_price
-                    }
-                    products.append(product)
-                    logger.info(f"Added product: {product_name[:50]}... - {list_price} {currency}")
-                else:
-                    logger.info(f"Skipped row {index}: name='{product_name}', price={list_price}")
-                    
-            except Exception as e:
-                logger.warning(f"Error processing row {index}: {e}")
-                continue
+        columns = list(df.columns)
+        # Aynı alana eşlenmiş birden fazla kolon satır bazında tek değer vermez, bu dosyalardan ürün çıkmaz
+        if any(columns.count(field) > 1 for field in ('product_name', 'brand', 'list_price', 'discounted_price', 'currency')):
+            logger.warning(f"Ambiguous column mapping, no products extracted: {columns}")
+            return products
+        
+        # Ürünleri çıkar - kolon bazında, iterrows gibi satırların ortak dtype'ı ile
+        values = df.to_numpy()
+        row_count = len(values)
+        position = {column: index for index, column in enumerate(columns)}
+        
+        # Ürün adı ve marka
+        product_names = pd.Series([""] * row_count, dtype=object)
+        if 'product_name' in position:
+            product_names = ExcelService._text_cells(values[:, position['product_name']])
+        brands = [""] * row_count
+        if 'brand' in position:
+            brands = ExcelService._text_cells(values[:, position['brand']]).tolist()
+        
+        # Liste fiyatı
+        list_prices = np.zeros(row_count)
+        if 'list_price' in position:
+            numbers, notna, failed = ExcelService._float_cells(values[:, position['list_price']])
+            list_prices = np.where(notna & ~failed, numbers, 0.0)
+        
+        # İndirimli fiyat
+        discounted_prices = np.full(row_count, None, dtype=object)
+        if 'discounted_price' in position:
+            numbers, notna, failed = ExcelService._float_cells(values[:, position['discounted_price']])
+            discounted_prices = np.where(notna & ~failed, numbers.astype(object), None)
+        
+        # Para birimi: önce sütun başlıkları (tüm satırlar için bir kez), yoksa satırdaki
+        # ilk para birimi içeren hücre, o da yoksa USD
+        header_currency = next((currency for currency in
+                                (ExcelService.detect_currency_from_text(str(column), None) for column in columns)
+                                if currency), None)
+        if header_currency:
+            currencies = np.full(row_count, header_currency, dtype=object)
+        else:
+            currencies = np.full(row_count, "USD", dtype=object)
+            if values.dtype == object:
+                # Sayısal/tarih kolonlarının metni para birimi içeremez; son kolondan başlayıp ilk eşleşme kazanır
+                for column_index in reversed(range(len(columns))):
+                    if df.dtypes.iloc[column_index] != object:
+                        continue
+                    detected = ExcelService._detect_cell_currencies(values[:, column_index])
+                    currencies = np.where(detected != None, detected, currencies)  # noqa: E711
+        
+        # Geçerli ürün kontrolü
+        valid = (product_names.str.len() > 3).to_numpy() & (list_prices > 0)
+        
+        for index in np.flatnonzero(valid):
+            products.append({
+                'name': product_names.iat[index],
+                'brand': brands[index],  # Yeni: marka alanı
+                'list_price': float(list_prices[index]),
+                'currency': currencies[index],
+                'discounted_price': discounted_prices[index]
+            })
+        logger.info(f"Added {len(products)} products, skipped {row_count - len(products)} rows")
         
         return products
 
@@ -1726,6 +2459,21 @@ async def update_exchange_rates():
         logger.error(f"Error updating exchange rates: {e}")
         raise HTTPException(status_code=500, detail="Döviz kurları güncellenemedi")
 
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Response cache counters (hit/miss/eviction) for sizing the cache"""
+    return response_cache.stats()
+
+@api_router.get("/worker-pools/stats")
+async def get_worker_pool_stats():
+    """Worker pool queue depth and job metrics"""
+    return {pool.name: pool.stats() for pool in worker_pools}
+
+@api_router.get("/pdf-cache/stats")
+async def get_pdf_cache_stats():
+    """Rendered PDF cache counters"""
+    return pdf_cache.stats()
+
 @api_router.post("/companies", response_model=Company)
 async def create_company(company: CompanyCreate):
     """Create a new company"""
@@ -1737,6 +2485,7 @@ async def create_company(company: CompanyCreate):
         }
         
         result = await db.companies.insert_one(company_dict)
+        invalidate_cache("companies")
         return Company(**company_dict)
         
     except Exception as e:
@@ -1762,7 +2511,10 @@ async def delete_company(company_id: str):
             raise HTTPException(status_code=404, detail="Firma bulunamadı")
         
         # Also delete all products of this company
+        if product_search_index is not None:
+            unindex_products(await db.products.distinct("id", {"company_id": company_id}))
         await db.products.delete_many({"company_id": company_id})
+        invalidate_cache("companies", "products")
         
         return {"success": True, "message": "Firma silindi"}
     except HTTPException:
@@ -2020,6 +2772,12 @@ async def update_product(product_id: str, update_data: ProductUpdate):
             else:
                 update_dict["discounted_price_try"] = None
         
+        # Manual edits must not look unchanged to the next Excel import
+        if any(field in update_dict for field in ("brand", "list_price", "discounted_price", "currency")):
+            update_dict["import_hash"] = None
+        if any(field in update_dict for field in ("name", "brand", "description")):
+            update_dict["search_key"] = product_search_key({**existing_product, **update_dict})
+        
         # Update product
         if update_dict:
             result = await db.products.update_one(
@@ -2029,6 +2787,8 @@ async def update_product(product_id: str, update_data: ProductUpdate):
             
             if result.modified_count == 0:
                 raise HTTPException(status_code=404, detail="Ürün güncellenemedi")
+            index_products([{"id": product_id, **update_dict}])
+            invalidate_cache("products")
         
         # Get updated product
         updated_product = await db.products.find_one({"id": product_id})
@@ -2051,6 +2811,8 @@ async def delete_product(product_id: str):
         result = await db.products.delete_one({"id": product_id})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Ürün bulunamadı")
+        unindex_products([product_id])
+        invalidate_cache("products")
         
         return {"success": True, "message": "Ürün silindi"}
     except HTTPException:
@@ -2089,6 +2851,12 @@ async def update_product(product_id: str, product_update: Dict[str, Any]):
             if field in product_update:
                 update_data[field] = product_update[field]
         
+        # Manual edits must not look unchanged to the next Excel import
+        if any(field in update_data for field in ("brand", "list_price", "discounted_price", "currency")):
+            update_data["import_hash"] = None
+        if any(field in update_data for field in ("name", "brand", "description")):
+            update_data["search_key"] = product_search_key({**existing_product, **update_data})
+        
         # Güncelleme zamanını ekle
         update_data["updated_at"] = datetime.utcnow().isoformat() + "Z"
         
@@ -2100,6 +2868,8 @@ async def update_product(product_id: str, product_update: Dict[str, Any]):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Ürün bulunamadı")
+        index_products([{"id": product_id, **update_data}])
+        invalidate_cache("products")
         
         # Güncellenmiş ürünü döndür
         updated_product = await db.products.find_one({"id": product_id})
@@ -2381,11 +3151,25 @@ async def update_quote(quote_id: str, quote_update: Dict[str, Any]):
         logger.error(f"Error updating quote: {e}")
         raise HTTPException(status_code=500, detail=f"Error updating quote: {str(e)}")
 
-class PDFQuoteGenerator:
+class SharedImage(Image):
+    """Image flowable that draws a pre-decoded ImageReader shared between renders"""
+
+    def __init__(self, reader, width=None, height=None):
+        self._img = reader  # set before Image.__init__ so it never re-reads the file
+        super().__init__(BytesIO(), width=width, height=height)
+
+class PDFResources:
+    """Fonts, paragraph styles and logo shared by every PDF render in this process.
+
+    Registering the Montserrat TTFs, building the stylesheet and decoding the logo
+    are done once (see get_pdf_resources) instead of in every generator __init__.
+    """
+
     def __init__(self):
         self.setup_fonts()
         self.styles = getSampleStyleSheet()
         self.setup_styles()
+        self.logo = self._load_logo()
     
     def setup_fonts(self):
         """Türkçe karakter desteği için font kurulumu"""
@@ -2538,10 +3322,63 @@ class PDFQuoteGenerator:
             spaceAfter=10,
             leading=18
         )
+        
+        # Paket tablo başlık stili
+        self.header_style = ParagraphStyle(
+            'PackageHeader',
+            parent=self.styles['Normal'],
+            fontName=self.get_font_name(is_bold=True),
+            fontSize=10,
+            alignment=TA_CENTER,
+            textColor=colors.white
+        )
+
+    def _load_logo(self):
+        """Logo PNG'sini bir kez çöz - None if missing"""
+        logo_path = ROOT_DIR / 'images' / 'corlu_karavan_logo_new.png'
+        if not logo_path.exists():
+            return None
+        try:
+            from reportlab.lib.utils import ImageReader
+            reader = ImageReader(str(logo_path))
+            reader.getRGBData()  # Decode now; ImageReader keeps the pixel data
+            return reader
+        except Exception as e:
+            logger.error(f"Logo loading error: {e}")
+            return None
+
+@lru_cache(maxsize=1)
+def get_pdf_resources() -> PDFResources:
+    """Process-wide PDF resources, built lazily on first use"""
+    return PDFResources()
 
-    def create_quote_pdf(self, quote_data: Dict) -> BytesIO:
-        """Gelişmiş teklif PDF'i oluştur - Türkçe karakter desteği ile"""
-        buffer = BytesIO()
+class PDFQuoteGenerator:
+    def __init__(self, eur_rate: Optional[float] = None):
+        # Worker processes have no rates_cache, so the rate is passed in explicitly
+        self.eur_rate = eur_rate
+        resources = get_pdf_resources()
+        self.resources = resources
+        self.montserrat_available = resources.montserrat_available
+        self.montserrat_bold_available = resources.montserrat_bold_available
+        self.styles = resources.styles
+        self.title_style = resources.title_style
+        self.subtitle_style = resources.subtitle_style
+        self.company_style = resources.company_style
+        self.normal_style = resources.normal_style
+        self.data_style = resources.data_style
+        self.footer_style = resources.footer_style
+        self.price_style = resources.price_style
+    
+    def get_font_name(self, is_bold=False):
+        """Montserrat font adını döndür - Türkçe karakter desteği ile"""
+        return self.resources.get_font_name(is_bold)
+    
+    def create_quote_pdf(self, quote_data: Dict, output: Optional[str] = None):
+        """Gelişmiş teklif PDF'i oluştur - Türkçe karakter desteği ile
+        
+        output verilirse PDF doğrudan o dosyaya yazılır, yoksa BytesIO döner.
+        """
+        buffer = BytesIO() if output is None else output
         
         # Yüksek kaliteli PDF ayarları
         doc = SimpleDocTemplate(
@@ -2615,6 +3452,8 @@ class PDFQuoteGenerator:
         
         # PDF oluştur
         doc.build(story)
+        if output is not None:
+            return output
         buffer.seek(0)
         return buffer
     
@@ -2622,13 +3461,10 @@ class PDFQuoteGenerator:
         """Logo ve Çorlu Karavan bilgileri başlığı - Yeni logo ile"""
         from reportlab.platypus import Table as PDFTable
         
-        # Yeni logo yolu
-        logo_path = Path(__file__).parent / 'images' / 'corlu_karavan_logo_new.png'
-        
-        # Header tablosu oluştur (Logo + Firma bilgileri)
-        if logo_path.exists():
+        # Header tablosu oluştur (Logo + Firma bilgileri) - logo önceden çözülmüş
+        if self.resources.logo is not None:
             try:
-                logo_img = Image(str(logo_path), width=80, height=80)
+                logo_img = SharedImage(self.resources.logo, width=80, height=80)
                 
                 # Firma bilgileri - ÇORLU KARAVAN yeni renk ile (#2F4B68)
                 company_info = [
@@ -2840,8 +3676,7 @@ class PDFQuoteGenerator:
         
         # Euro karşılığı - Güncel kurdan hesaplanmış
         try:
-            # Use cached exchange rates (no async needed)
-            eur_rate = float(currency_service.rates_cache.get('EUR', 48.5)) if currency_service.rates_cache else 48.5
+            eur_rate = self.eur_rate if self.eur_rate is not None else get_cached_eur_rate()
             net_total_eur = net_total / eur_rate
             
             euro_text = f"<font size='10' color='#666666'><i>(€ {self._format_price_modern(net_total_eur)} EUR)</i></font>"
@@ -2901,17 +3736,9 @@ class PDFQuoteGenerator:
 class PDFPackageGenerator(PDFQuoteGenerator):
     """Paket PDF oluşturucu - Teklif taslağını kullanan"""
     
-    def __init__(self):
-        super().__init__()  # PDFQuoteGenerator'dan miras al
-        # Eksik style'ları ekle
-        self.header_style = ParagraphStyle(
-            'PackageHeader',
-            parent=self.styles['Normal'],
-            fontName=self.get_font_name(is_bold=True),
-            fontSize=10,
-            alignment=TA_CENTER,
-            textColor=colors.white
-        )
+    def __init__(self, eur_rate: Optional[float] = None):
+        super().__init__(eur_rate)  # PDFQuoteGenerator'dan miras al
+        self.header_style = self.resources.header_style
 
     def _format_price_modern(self, price):
         """Modern format ile fiyat gösterimi"""
@@ -2922,9 +3749,12 @@ class PDFPackageGenerator(PDFQuoteGenerator):
         formatted = f"{float(price):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
         return formatted
 
-    def generate_package_pdf(self, package_data, products, include_prices=True, categories=None, category_groups=None):
-        """Teklif taslağını kullanarak paket PDF'i oluştur"""
-        buffer = BytesIO()
+    def generate_package_pdf(self, package_data, products, include_prices=True, categories=None, category_groups=None, output: Optional[str] = None):
+        """Teklif taslağını kullanarak paket PDF'i oluştur
+        
+        output verilirse PDF doğrudan o dosyaya yazılır, yoksa BytesIO döner.
+        """
+        buffer = BytesIO() if output is None else output
         
         # Veriler parametre olarak geçildiyse onları kullan, yoksa boş liste
         if categories is None:
@@ -3021,6 +3851,8 @@ class PDFPackageGenerator(PDFQuoteGenerator):
         
         # PDF oluştur
         doc.build(story)
+        if output is not None:
+            return output
         buffer.seek(0)
         return buffer
     
@@ -3316,8 +4148,7 @@ class PDFPackageGenerator(PDFQuoteGenerator):
         
         # Euro karşılığı
         try:
-            # Use cached exchange rates (no async needed)
-            eur_rate = float(currency_service.rates_cache.get('EUR', 48.5)) if currency_service.rates_cache else 48.5
+            eur_rate = self.eur_rate if self.eur_rate is not None else get_cached_eur_rate()
             final_total_eur = final_total / eur_rate
             
             table_data.append([
@@ -3384,6 +4215,188 @@ class PDFPackageGenerator(PDFQuoteGenerator):
         
         return [totals_table]
 
+def get_cached_eur_rate() -> float:
+    """EUR rate from the exchange rate cache (no async needed)"""
+    return float(currency_service.rates_cache.get('EUR', 48.5)) if currency_service.rates_cache else 48.5
+
+# PDF render jobs - top-level functions so they can be pickled to worker processes.
+# They write straight to output_path, so the PDF never exists in memory twice.
+def render_package_pdf(output_path, package, products, include_prices, categories, category_groups, eur_rate) -> int:
+    generator = PDFPackageGenerator(eur_rate=eur_rate)
+    generator.generate_package_pdf(package, products, include_prices=include_prices, categories=categories, category_groups=category_groups, output=output_path)
+    return os.path.getsize(output_path)
+
+def render_quote_pdf(output_path, quote, eur_rate) -> int:
+    generator = PDFQuoteGenerator(eur_rate=eur_rate)
+    generator.create_quote_pdf(quote, output=output_path)
+    return os.path.getsize(output_path)
+
+async def run_pdf_job(func, *args, cleanup=None):
+    """Render a PDF on the worker pool, mapping pool errors to HTTP errors"""
+    try:
+        return await pdf_worker_pool.run(func, *args, cleanup=cleanup)
+    except WorkerPoolBusyError:
+        raise HTTPException(status_code=503, detail="PDF kuyruğu dolu, lütfen biraz sonra tekrar deneyin")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="PDF oluşturma zaman aşımına uğradı")
+
+# Rendered PDF cache - bump PDF_TEMPLATE_VERSION whenever the PDF layout changes
+PDF_TEMPLATE_VERSION = "1"
+PDF_CACHE_DIR = Path(os.environ.get('PDF_CACHE_DIR', ROOT_DIR / 'pdf_cache'))
+PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))  # 0 disables
+
+class PDFCache:
+    """Content-addressed on-disk cache for rendered PDFs.
+
+    Keys hash everything that ends up in the document (hydrated data, price mode,
+    template version, EUR rate and the printed date), so any change to a quote,
+    package, product price or exchange rate simply produces a new key. Old files
+    are evicted least-recently-used (by mtime) once the directory exceeds max_bytes.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.current_bytes = None  # scanned lazily
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(kind: str, *parts) -> str:
+        payload = json.dumps(
+            [PDF_TEMPLATE_VERSION, kind, datetime.now().strftime('%Y-%m-%d'), parts],
+            sort_keys=True, default=str, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of the cached PDF or None"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def temp_path(self, key: str) -> Path:
+        """Temporary file in the cache directory for a render in progress"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self.directory / f"{key}.{uuid.uuid4().hex}.tmp"
+
+    def commit(self, key: str, tmp_path: Path, size: int) -> Path:
+        """Atomically move a finished render into the cache and evict old entries if needed"""
+        path = self._path(key)
+        os.replace(tmp_path, path)
+        try:
+            if self.current_bytes is None:
+                self._scan()
+            else:
+                self.current_bytes += size
+            if self.current_bytes > self.max_bytes:
+                self._evict()
+        except OSError as e:
+            logger.warning(f"PDF cache eviction failed: {e}")
+        return path
+
+    def _files(self):
+        return [(f, f.stat()) for f in self.directory.glob("*.pdf")]
+
+    def _scan(self):
+        self.current_bytes = sum(stat.st_size for _, stat in self._files())
+        # Leftovers from renders interrupted by a restart or crash
+        for tmp_file in self.directory.glob("*.tmp"):
+            try:
+                if time.time() - tmp_file.stat().st_mtime > 3600:
+                    tmp_file.unlink()
+            except OSError:
+                pass
+
+    def _evict(self):
+        files = sorted(self._files(), key=lambda item: item[1].st_mtime)
+        self.current_bytes = sum(stat.st_size for _, stat in files)
+        # Evict down to 90% so we don't rescan on every write
+        for path, stat in files:
+            if self.current_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                path.unlink()
+                self.current_bytes -= stat.st_size
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "directory": str(self.directory),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+            "evictions": self.evictions
+        }
+
+pdf_cache = PDFCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
+
+def remove_file(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+async def cached_pdf_response(cache_key: str, render_job, render_args: tuple, filename_header: str):
+    """Serve a rendered PDF from the cache, rendering it on the worker pool on a miss.
+    
+    The worker writes the PDF to disk and the response streams it from there in
+    chunks with a Content-Length, so the PDF is never held in memory.
+    """
+    headers = {"Content-Disposition": filename_header}
+    cached_path = pdf_cache.get(cache_key)
+    if cached_path is not None:
+        return FileResponse(cached_path, media_type="application/pdf", headers=headers)
+    
+    tmp_path = None
+    if pdf_cache.enabled:
+        try:
+            tmp_path = pdf_cache.temp_path(cache_key)
+        except OSError as e:
+            logger.warning(f"PDF cache directory not usable: {e}")
+    if tmp_path is None:
+        fd, tmp_name = tempfile.mkstemp(prefix="pdf_", suffix=".pdf")
+        os.close(fd)
+        tmp_path = Path(tmp_name)
+    
+    try:
+        # A render that times out keeps writing; its file is deleted again once it finishes
+        size = await run_pdf_job(render_job, str(tmp_path), *render_args, cleanup=lambda: remove_file(tmp_path))
+    except BaseException:
+        remove_file(tmp_path)
+        raise
+    
+    if pdf_cache.enabled and tmp_path.parent == pdf_cache.directory and size <= pdf_cache.max_bytes:
+        try:
+            path = pdf_cache.commit(cache_key, tmp_path, size)
+            return FileResponse(path, media_type="application/pdf", headers=headers)
+        except OSError as e:
+            logger.warning(f"Could not write PDF cache entry: {e}")
+    # Not cached - delete the temp file once it has been sent
+    return FileResponse(tmp_path, media_type="application/pdf", headers=headers,
+                        background=BackgroundTask(remove_file, tmp_path))
+
 # ===== PACKAGE PDF ENDPOINTS =====
 
 @app.get("/api/packages/{package_id}/pdf-with-prices")
@@ -3391,17 +4404,15 @@ async def download_package_pdf_with_prices(package_id: str):
     """Paket PDF'i indir - ürün isimleri ve liste fiyatları ile"""
     try:
         # Paket ve ürünleri getir
-        package = await db.packages.find_one({"id": package_id})
-        if not package:
+        hydrated = await hydrate_package(package_id, with_categories=True)
+        if not hydrated:
             raise HTTPException(status_code=404, detail="Paket bulunamadı")
-        
-        # Paket ürünlerini getir
-        package_products = await db.package_products.find({"package_id": package_id}).to_list(None)
+        package = hydrated.package
         
         # Ürün detaylarını al
         products = []
-        for pp in package_products:
-            product = await db.products.find_one({"id": pp["product_id"]})
+        for pp in hydrated.package_products:
+            product = hydrated.products_by_id.get(pp["product_id"])
             if product:
                 # Use custom price if available, otherwise use original prices
                 custom_price = pp.get("custom_price")
@@ -3425,24 +4436,20 @@ async def download_package_pdf_with_prices(package_id: str):
                 }
                 products.append(product_data)
         
-        # Kategorileri ve kategori gruplarını önceden getir
-        categories = await db.categories.find().to_list(None)
-        category_groups = await db.category_groups.find().to_list(None)
-        
-        # PDF oluştur
-        generator = PDFPackageGenerator()
-        pdf_buffer = generator.generate_package_pdf(package, products, include_prices=True, categories=categories, category_groups=category_groups)
-        
         # Dosya adı - Turkish character safe
         safe_name = package["name"].encode('ascii', 'ignore').decode('ascii')
         if not safe_name:
             safe_name = "paket"
         filename = f"paket_{safe_name}_fiyatli.pdf"
         
-        return StreamingResponse(
-            io.BytesIO(pdf_buffer.read()),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        # PDF oluştur (önbellek yoksa worker pool'da)
+        render_args = (
+            package, products, True,
+            list(hydrated.categories), list(hydrated.category_groups), get_cached_eur_rate()
+        )
+        cache_key = pdf_cache.make_key("package", *render_args)
+        return await cached_pdf_response(
+            cache_key, render_package_pdf, render_args, f"attachment; filename={filename}"
         )
         
     except HTTPException:
@@ -3456,17 +4463,15 @@ async def download_package_pdf_without_prices(package_id: str):
     """Paket PDF'i indir - sadece ürün isimleri ile"""
     try:
         # Paket ve ürünleri getir
-        package = await db.packages.find_one({"id": package_id})
-        if not package:
+        hydrated = await hydrate_package(package_id, with_categories=True)
+        if not hydrated:
             raise HTTPException(status_code=404, detail="Paket bulunamadı")
-        
-        # Paket ürünlerini getir
-        package_products = await db.package_products.find({"package_id": package_id}).to_list(None)
+        package = hydrated.package
         
         # Ürün detaylarını al
         products = []
-        for pp in package_products:
-            product = await db.products.find_one({"id": pp["product_id"]})
+        for pp in hydrated.package_products:
+            product = hydrated.products_by_id.get(pp["product_id"])
             if product:
                 product_data = {
                     "name": product["name"],
@@ -3477,24 +4482,20 @@ async def download_package_pdf_without_prices(package_id: str):
                 }
                 products.append(product_data)
         
-        # Kategorileri ve kategori gruplarını önceden getir
-        categories = await db.categories.find().to_list(None)
-        category_groups = await db.category_groups.find().to_list(None)
-        
-        # PDF oluştur
-        generator = PDFPackageGenerator()
-        pdf_buffer = generator.generate_package_pdf(package, products, include_prices=False, categories=categories, category_groups=category_groups)
-        
         # Dosya adı - Turkish character safe
         safe_name = package["name"].encode('ascii', 'ignore').decode('ascii')
         if not safe_name:
             safe_name = "paket"
         filename = f"paket_{safe_name}_liste.pdf"
         
-        return StreamingResponse(
-            io.BytesIO(pdf_buffer.read()),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        # PDF oluştur (önbellek yoksa worker pool'da)
+        render_args = (
+            package, products, False,
+            list(hydrated.categories), list(hydrated.category_groups), get_cached_eur_rate()
+        )
+        cache_key = pdf_cache.make_key("package", *render_args)
+        return await cached_pdf_response(
+            cache_key, render_package_pdf, render_args, f"attachment; filename={filename}"
         )
         
     except HTTPException:
@@ -3514,26 +4515,20 @@ async def download_quote_pdf(quote_id: str):
         if not quote:
             raise HTTPException(status_code=404, detail="Quote not found")
         
-        # PDF oluştur
-        pdf_generator = PDFQuoteGenerator()
-        pdf_buffer = pdf_generator.create_quote_pdf(quote)
-        
         # Response headers - ensure proper encoding for Turkish characters
         safe_filename = quote["name"].encode('ascii', 'ignore').decode('ascii')
         if not safe_filename:
             safe_filename = "teklif"
         
-        headers = {
-            'Content-Type': 'application/pdf',
-            'Content-Disposition': f'attachment; filename="{safe_filename}.pdf"'
-        }
-        
-        return StreamingResponse(
-            BytesIO(pdf_buffer.read()),
-            media_type='application/pdf',
-            headers=headers
+        # PDF oluştur (önbellek yoksa worker pool'da)
+        render_args = (quote, get_cached_eur_rate())
+        cache_key = pdf_cache.make_key("quote", *render_args)
+        return await cached_pdf_response(
+            cache_key, render_quote_pdf, render_args, f'attachment; filename="{safe_filename}.pdf"'
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating PDF: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating PDF: {str(e)}")
@@ -3552,6 +4547,7 @@ async def create_category(category: CategoryCreate):
         }
         
         result = await db.categories.insert_one(category_dict)
+        invalidate_cache("categories")
         return Category(**category_dict)
         
     except Exception as e:
@@ -3591,6 +4587,7 @@ async def update_category(category_id: str, update_data: CategoryCreate):
             
             if result.modified_count == 0:
                 raise HTTPException(status_code=404, detail="Kategori bulunamadı")
+            invalidate_cache("categories")
         
         # Get updated category
         updated_category = await db.categories.find_one({"id": category_id})
@@ -3620,6 +4617,7 @@ async def reorder_categories(category_orders: List[Dict[str, Any]]):
                     {"id": category_id},
                     {"$set": {"sort_order": sort_order}}
                 )
+        invalidate_cache("categories")
         
         # Return updated categories sorted by new order
         categories = await db.categories.find().sort([("sort_order", 1), ("name", 1)]).to_list(None)
@@ -3654,6 +4652,7 @@ async def delete_category(category_id: str):
         
         # Then delete the category
         result = await db.categories.delete_one({"id": category_id})
+        invalidate_cache("categories", "products")
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Kategori bulunamadı")
@@ -3697,6 +4696,7 @@ async def add_supplies_to_package(package_id: str, supplies: List[PackageSupplyC
         
         if package_supplies:
             await db.package_supplies.insert_many(package_supplies)
+        invalidate_cache("packages")
         
         return {"success": True, "message": f"{len(package_supplies)} sarf malzemesi pakete eklendi"}
     except HTTPException:
@@ -3717,6 +4717,7 @@ async def remove_supply_from_package(package_id: str, supply_id: str):
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Sarf malzemesi bulunamadı")
+        invalidate_cache("packages")
         
         return {"success": True, "message": "Sarf malzemesi paketten çıkarıldı"}
     except HTTPException:
@@ -3740,6 +4741,7 @@ async def update_supply_quantity(package_id: str, supply_id: str, quantity: int)
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Sarf malzemesi bulunamadı")
+        invalidate_cache("packages")
         
         return {"success": True, "message": "Sarf malzemesi adeti güncellendi"}
     except HTTPException:
@@ -3759,6 +4761,7 @@ async def remove_product_from_package(package_id: str, package_product_id: str):
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Paket ürünü bulunamadı")
+        invalidate_cache("packages")
         
         return {"success": True, "message": "Ürün paketten çıkarıldı"}
     except HTTPException:
@@ -3807,6 +4810,7 @@ async def assign_product_to_category(product_id: str, category_id: str = None):
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Ürün bulunamadı")
+        invalidate_cache("products")
         
         return {"success": True, "message": "Ürün kategoriye atandı"}
         
@@ -3836,6 +4840,7 @@ async def toggle_product_favorite(product_id: str):
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Ürün bulunamadı")
+        invalidate_cache("products")
         
         status_message = "favorilere eklendi" if new_favorite else "favorilerden çıkarıldı"
         return {
@@ -3872,6 +4877,7 @@ async def toggle_product_favorite_v2(product_id: str):
             {"id": product_id},
             {"$set": update_data}
         )
+        invalidate_cache("products")
         
         return {"success": True, "is_favorite": new_favorite_status}
         
@@ -3899,6 +4905,7 @@ async def update_product_stock(product_id: str, stock_quantity: int = Form(...))
             {"id": product_id},
             {"$set": {"stock_quantity": stock_quantity}}
         )
+        invalidate_cache("products")
         
         return {
             "success": True, 
@@ -3935,6 +4942,7 @@ async def create_package(package: PackageCreate):
             package_data["sale_price"] = float(package_data["sale_price"])
         
         result = await db.packages.insert_one(package_data)
+        invalidate_cache("packages")
         if result.inserted_id:
             created_package = await db.packages.find_one({"id": package_data["id"]})
             return Package(**created_package)
@@ -4002,6 +5010,7 @@ async def update_package(package_id: str, package_data: PackageUpdate):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Paket bulunamadı")
+        invalidate_cache("packages")
         
         # Get updated package
         updated_package = await db.packages.find_one({"id": package_id})
@@ -4022,20 +5031,18 @@ async def update_package(package_id: str, package_data: PackageUpdate):
 async def get_package_with_products(package_id: str):
     """Get package with its products"""
     try:
-        # Get package
-        package = await db.packages.find_one({"id": package_id})
-        if not package:
+        # Get package, line items and products
+        hydrated = await hydrate_package(package_id)
+        if not hydrated:
             raise HTTPException(status_code=404, detail="Paket bulunamadı")
-        
-        # Get package products
-        package_products = await db.package_products.find({"package_id": package_id}).to_list(None)
+        package = hydrated.package
         
         # Get product details and calculate totals
         products = []
         total_discounted_price = Decimal('0')
         
-        for pp in package_products:
-            product = await db.products.find_one({"id": pp["product_id"]})
+        for pp in hydrated.package_products:
+            product = hydrated.products_by_id.get(pp["product_id"])
             if product:
                 # Use custom price if available, otherwise use original prices
                 custom_price = pp.get("custom_price")
@@ -4077,15 +5084,12 @@ async def get_package_with_products(package_id: str):
                 # Calculate total using effective price
                 total_discounted_price += effective_price_try * pp["quantity"]
 
-        # Get package supplies (sarf malzemeleri)
-        package_supplies = await db.package_supplies.find({"package_id": package_id}).to_list(None)
-        
-        # Get supply details and calculate totals
+        # Get supply details (sarf malzemeleri) and calculate totals
         supplies = []
         total_supplies_price = Decimal('0')
         
-        for ps in package_supplies:
-            supply = await db.products.find_one({"id": ps["product_id"]})
+        for ps in hydrated.package_supplies:
+            supply = hydrated.products_by_id.get(ps["product_id"])
             if supply:
                 supply_data = {
                     "id": supply["id"],
@@ -4147,6 +5151,7 @@ async def update_package(package_id: str, package: PackageCreate):
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Paket bulunamadı")
+        invalidate_cache("packages")
         
         updated_package = await db.packages.find_one({"id": package_id})
         return Package(**updated_package)
@@ -4172,6 +5177,7 @@ async def toggle_package_pin(package_id: str):
             {"id": package_id},
             {"$set": {"is_pinned": new_pin_status}}
         )
+        invalidate_cache("packages")
         
         action = "sabitlendi" if new_pin_status else "sabitleme kaldırıldı"
         
@@ -4250,6 +5256,7 @@ async def copy_package(package_id: str, new_name: str = Form(...)):
             await db.package_supplies.insert_many(copied_supplies)
             logger.info(f"Copied {len(copied_supplies)} supplies to new package")
         
+        invalidate_cache("packages")
         return {
             "success": True, 
             "message": f"Paket başarıyla kopyalandı: {new_name}",
@@ -4276,6 +5283,7 @@ async def delete_package(package_id: str):
         
         # Delete package
         result = await db.packages.delete_one({"id": package_id})
+        invalidate_cache("packages")
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Paket bulunamadı")
         
@@ -4319,6 +5327,7 @@ async def add_products_to_package(package_id: str, products: List[PackageProduct
         
         if package_products:
             await db.package_products.insert_many(package_products)
+        invalidate_cache("packages")
         
         return {"success": True, "message": f"{len(package_products)} ürün pakete eklendi"}
     except HTTPException:
@@ -4367,6 +5376,7 @@ async def update_package_product(package_id: str, package_product_id: str, updat
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Paket ürünü bulunamadı")
+        invalidate_cache("packages")
         
         # Get updated product info for response
         updated_product = await db.package_products.find_one({"id": package_product_id})
@@ -4406,244 +5416,1118 @@ async def get_favorite_products():
         logger.error(f"Error getting favorite products: {e}")
         raise HTTPException(status_code=500, detail="Favori ürünler getirilemedi")
 
-@api_router.post("/companies/{company_id}/upload-excel")  
-async def upload_excel(company_id: str, file: UploadFile = File(...), currency: str = Form(None), discount: str = Form("0")):
-    """Upload Excel file for a company with smart update system"""
+# ===== EXCEL IMPORT =====
+
+def spool_products(products: Iterator[Dict[str, Any]], spool_path: str) -> int:
+    """Write parsed products to a JSON-lines file one at a time, returns the count"""
+    count = 0
+    with open(spool_path, 'w', encoding='utf-8') as spool:
+        for product in products:
+            spool.write(json.dumps(product, ensure_ascii=False))
+            spool.write('\n')
+            count += 1
+    return count
+
+# Supplier format registry. The format that imported a company's last list is remembered
+# on the company with its fingerprint; a new upload with the same fingerprint goes straight
+# to that parser instead of trying color-based parsing first.
+class ExcelFormat(NamedTuple):
+    name: str
+    fingerprint_fields: tuple  # excel_fingerprint() keys that identify files in this format
+    parse: Callable[[Any, str], Iterator[Dict[str, Any]]]  # (source, company_name) -> products
+
+def row_format_parser(format_name: str):
+    """Parser for one of the row-based ExcelService formats"""
+    def parse(source, company_name: str):
+        return excel_service.parse_excel_file(source, format_name)
+    return parse
+
+EXCEL_FORMATS = {excel_format.name: excel_format for excel_format in (
+    ExcelFormat('colored', ('sheets', 'header'), ColorBasedExcelService.iter_colored_products),
+    ExcelFormat('elektrozirve', ('sheets', 'header', 'columns'), row_format_parser('elektrozirve')),
+    ExcelFormat('havensis', ('sheets', 'header', 'columns'), row_format_parser('havensis')),
+    ExcelFormat('general', ('sheets', 'header', 'columns'), row_format_parser('general')),
+    # Başlıksız dosyalarda ilk metin satırı üründür, her listede değişir
+    ExcelFormat('headerless', ('sheets', 'columns'), row_format_parser('headerless')),
+)}
+
+def excel_fingerprint(source) -> Optional[Dict[str, Any]]:
+    """Sheet names, header cells and column count of the first sheet, from its first rows only"""
     try:
-        # Verify company exists
-        company = await db.companies.find_one({"id": company_id})
-        if not company:
-            raise HTTPException(status_code=404, detail="Firma bulunamadı")
-        
-        # Check file type
-        if not file.filename.endswith(('.xlsx', '.xls')):
-            raise HTTPException(status_code=400, detail="Sadece Excel dosyaları (.xlsx, .xls) kabul edilir")
+        workbook = openpyxl.load_workbook(excel_source(source), read_only=True, data_only=True)
+        try:
+            sheet_names = list(workbook.sheetnames)
+            head = list(workbook.worksheets[0].iter_rows(max_row=COLORED_HEADER_SEARCH_ROWS, values_only=True))
+        finally:
+            workbook.close()
+    except Exception:
+        return None
+    
+    def is_text(value):
+        if not isinstance(value, str) or not value.strip():
+            return False
+        try:
+            float(value.replace(',', '.'))
+            return False  # Metin olarak yazılmış fiyat
+        except ValueError:
+            return True
+    
+    # Header: en az iki metin hücresi olan ilk satırın metinleri
+    header = next((texts for texts in ([value.strip().lower() for value in row if is_text(value)] for row in head)
+                   if len(texts) >= 2), [])
+    return {
+        "sheets": sheet_names,
+        "header": header,
+        "columns": max((index + 1 for row in head for index, value in enumerate(row) if value is not None), default=0)
+    }
+
+def format_fingerprint(format_name: str, fingerprint: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Hash of the fingerprint fields the format declares"""
+    if not fingerprint:
+        return None
+    fields = {field: fingerprint[field] for field in EXCEL_FORMATS[format_name].fingerprint_fields}
+    return hashlib.sha256(json.dumps([format_name, fields], ensure_ascii=False).encode()).hexdigest()
+
+def parse_result(product_count: int, format_name: str, fingerprint: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "product_count": product_count,
+        "format": format_name,
+        "fingerprint": format_fingerprint(format_name, fingerprint)
+    }
+
+def parse_excel_products(source, company_name: str, spool_path: str,
+                         known_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Parse with the company's known format when the file matches it, otherwise try
+    color-based parsing first, then fall back to traditional parsing"""
+    fingerprint = excel_fingerprint(source)
+    
+    format_name = (known_format or {}).get('name')
+    if (format_name in EXCEL_FORMATS and
+            format_fingerprint(format_name, fingerprint) == known_format.get('fingerprint')):
+        try:
+            product_count = spool_products(EXCEL_FORMATS[format_name].parse(source, company_name), spool_path)
+            logger.info(f"Known {format_name} format used: {product_count} products")
+            return parse_result(product_count, format_name, fingerprint)
+        except ExcelParseBudgetError:
+            raise
+        except Exception as known_format_error:
+            logger.warning(f"Known {format_name} format failed, detecting format: {known_format_error}")
+    
+    try:
+        # Color-based parsing
+        product_count = spool_products(ColorBasedExcelService.iter_colored_products(source, company_name), spool_path)
+        logger.info(f"Color-based parsing successful: {product_count} products")
+        return parse_result(product_count, 'colored', fingerprint)
+    except ExcelParseBudgetError:
+        raise
+    except Exception as color_parse_error:
+        logger.warning(f"Color-based parsing failed: {color_parse_error}")
+    
+    # Fall back to traditional parsing (spooling again truncates the partial output)
+    format_name, products = excel_service.parse_excel_file_with_format(source)
+    product_count = spool_products(iter(products), spool_path)
+    logger.info(f"Traditional parsing used ({format_name}): {product_count} products")
+    return parse_result(product_count, format_name, fingerprint)
+
+# Excel parse jobs - top-level functions so they can be pickled to worker processes.
+# Workers read the upload from disk and spool products to a file instead of returning
+# them, so neither process ever holds the whole product list.
+# HTTPException does not survive pickling, so workers raise ValueError(detail) instead.
+def parse_excel_job(source: str, company_name: str, spool_path: str,
+                    known_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    with cpu_budget(EXCEL_PARSE_CPU_BUDGET):
+        try:
+            return parse_excel_products(source, company_name, spool_path, known_format)
+        except HTTPException as e:
+            raise ValueError(e.detail)
+
+def parse_colored_sheet_job(source: str, company_name: str, sheet_name: str, spool_path: str) -> int:
+    with cpu_budget(EXCEL_PARSE_CPU_BUDGET):
+        try:
+            return spool_products(ColorBasedExcelService.iter_colored_products(source, company_name, [sheet_name]), spool_path)
+        except ExcelParseBudgetError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Renkli Excel dosyası işlenemedi: {str(e)}")
+
+def parse_traditional_excel_job(source: str, spool_path: str) -> Dict[str, Any]:
+    with cpu_budget(EXCEL_PARSE_CPU_BUDGET):
+        try:
+            format_name, products = excel_service.parse_excel_file_with_format(source)
+            return parse_result(spool_products(iter(products), spool_path), format_name, excel_fingerprint(source))
+        except HTTPException as e:
+            raise ValueError(e.detail)
+
+def get_excel_sheet_names(source) -> List[str]:
+    """Sheet names without loading any cells (read-only mode only reads workbook.xml)"""
+    try:
+        workbook = openpyxl.load_workbook(excel_source(source), read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+    except Exception:
+        return []
+
+def concatenate_files(part_paths: List[str], target_path: str):
+    with open(target_path, 'wb') as target:
+        for part_path in part_paths:
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, target)
+
+async def parse_excel_in_pool(source: str, company_name: str, spool_path: str,
+                              known_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Parse an Excel file on disk on the Excel worker pool into a JSON-lines spool file.
+    
+    Multi-sheet workbooks are parsed one sheet per job when the pool has more
+    than one worker; each job opens the workbook itself, so this only pays off
+    for workbooks whose sheets are large. Returns the product count with the
+    format used and its fingerprint.
+    """
+    try:
+        sheet_names = []
+        if excel_worker_pool.max_workers > 1:
+            sheet_names = await asyncio.to_thread(get_excel_sheet_names, source)
         
-        # Read file content
-        file_content = await file.read()
+        # Per-sheet jobs only apply to color-based parsing
+        if len(sheet_names) <= 1 or (known_format and known_format.get('name') != 'colored'):
+            return await excel_worker_pool.run(parse_excel_job, source, company_name, spool_path, known_format)
         
-        # Try color-based parsing first, then fall back to traditional parsing
+        part_paths = [f"{spool_path}.{index}" for index in range(len(sheet_names))]
         try:
-            # Color-based parsing
-            products_data = ColorBasedExcelService.parse_colored_excel(file_content, company['name'])
-            logger.info(f"Color-based parsing successful: {len(products_data)} products")
-        except Exception as color_parse_error:
-            logger.warning(f"Color-based parsing failed: {color_parse_error}")
-            # Fall back to traditional parsing
-            products_data = excel_service.parse_excel_file(file_content)
-            logger.info(f"Traditional parsing used: {len(products_data)} products")
-        
-        if not products_data:
+            # Every sheet job settles before the parts are read or removed or the fallback is queued;
+            # a job that outlives its timeout removes its own part when it ends
+            sheet_results = await asyncio.gather(*(
+                excel_worker_pool.run(parse_colored_sheet_job, source, company_name, sheet_name, part_path,
+                                      cleanup=lambda path=part_path: remove_file(path))
+                for sheet_name, part_path in zip(sheet_names, part_paths)
+            ), return_exceptions=True)
+            for result in sheet_results:
+                if isinstance(result, BaseException) and not isinstance(result, ValueError):
+                    raise result
+            color_parse_error = next((result for result in sheet_results if isinstance(result, ValueError)), None)
+            if color_parse_error is None:
+                await asyncio.to_thread(concatenate_files, part_paths, spool_path)
+                product_count = sum(sheet_results)
+                logger.info(f"Color-based parsing successful: {product_count} products from {len(sheet_names)} sheets")
+                return parse_result(product_count, 'colored', await asyncio.to_thread(excel_fingerprint, source))
+        finally:
+            for part_path in part_paths:
+                remove_file(part_path)
+        logger.warning(f"Color-based parsing failed: {color_parse_error}")
+        return await excel_worker_pool.run(parse_traditional_excel_job, source, spool_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExcelParseBudgetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WorkerPoolBusyError:
+        raise HTTPException(status_code=503, detail="Excel işleme kuyruğu dolu, lütfen biraz sonra tekrar deneyin")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Excel dosyası işleme zaman aşımına uğradı")
+
+async def iter_spooled_products(spool_path: Path, batch_size: int = EXCEL_IMPORT_BATCH_SIZE):
+    """Read spooled products back a batch of lines at a time"""
+    spool = await asyncio.to_thread(open, spool_path, encoding='utf-8')
+    try:
+        while True:
+            lines = await asyncio.to_thread(lambda: list(itertools.islice(spool, batch_size)))
+            if not lines:
+                break
+            for line in lines:
+                yield json.loads(line)
+    finally:
+        spool.close()
+
+async def reprice_products(query: Dict[str, Any], rate_snapshot: Dict[str, Any]) -> Dict[str, int]:
+    """Recompute the TRY prices of matching products inside MongoDB; returns matched counts per currency
+    
+    One update_many per currency multiplies the stored prices by the snapshot rate,
+    so no product is loaded into the app. TRY products are left as they are.
+    """
+    rates = {currency: rate for currency, rate in rate_snapshot['rates'].items() if currency != 'TRY'}
+    
+    def repricing(rate: float) -> List[Dict[str, Any]]:
+        return [{"$set": {
+            "list_price_try": {"$multiply": ["$list_price", rate]},
+            "discounted_price_try": {"$cond": [
+                {"$and": [{"$isNumber": "$discounted_price"}, {"$ne": ["$discounted_price", 0]}]},
+                {"$multiply": ["$discounted_price", rate]},
+                None
+            ]}
+        }}]
+    
+    def currency_pattern(*currencies: str) -> re.Pattern:
+        # Case doesn't matter, as with convert_to_try's upper(); stray whitespace is ignored too
+        return re.compile(r"^\s*(" + "|".join(re.escape(currency) for currency in currencies) + r")\s*$", re.IGNORECASE)
+    
+    currency_counts = {}
+    for currency, rate in rates.items():
+        result = await db.products.update_many(
+            {**query, "currency": currency_pattern(currency), "list_price": {"$type": "number"}},
+            repricing(float(rate))
+        )
+        currency_counts[currency] = result.matched_count
+    
+    # Currencies without a rate convert 1:1, as convert_to_try does
+    result = await db.products.update_many(
+        {**query, "currency": {"$type": "string", "$not": currency_pattern('TRY', *rates)}, "list_price": {"$type": "number"}},
+        repricing(1.0)
+    )
+    if result.matched_count:
+        currency_counts["OTHER"] = result.matched_count
+    return currency_counts
+
+def product_import_hash(brand: str, list_price: float, discounted_price: Optional[float], currency: str) -> str:
+    """Hash of the fields an import writes, in the list's own currency
+
+    TRY prices are left out on purpose, so a rate change alone does not make a
+    supplier row count as changed; the import reprices unchanged rows in MongoDB.
+    """
+    return hashlib.sha256(json.dumps([brand, list_price, discounted_price, currency], ensure_ascii=False).encode()).hexdigest()
+
+async def parse_excel_upload(company: Dict[str, Any], file_path: Path) -> Dict[str, Any]:
+    """Parse a stored upload into a new spool file; returns the parse result with its spool_path"""
+    IMPORT_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    spool_path = IMPORT_UPLOAD_DIR / f"{uuid.uuid4()}.jsonl"
+    try:
+        # Parsing is CPU-bound (openpyxl), run it on the Excel worker pool
+        parsed = await parse_excel_in_pool(str(file_path), company['name'], str(spool_path), company.get('excel_format'))
+        if not parsed['product_count']:
             raise HTTPException(status_code=400, detail="Excel dosyasında geçerli ürün verisi bulunamadı")
-        
-        # Handle user-selected currency override
-        user_selected_currency = None
-        if currency and currency.upper() in ['USD', 'EUR', 'TRY']:
-            user_selected_currency = currency.upper()
-            logger.info(f"User selected currency override: {user_selected_currency}")
-        
-        # Handle discount percentage
-        discount_percentage = 0.0
+    except BaseException:
+        remove_file(spool_path)
+        raise
+    parsed['spool_path'] = spool_path
+    return parsed
+
+async def import_excel_products(company: Dict[str, Any], filename: str, file_path: Optional[Path],
+                                user_selected_currency: Optional[str], discount_percentage: float,
+                                job: Optional["ImportJob"] = None, upload_id: Optional[str] = None,
+                                parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Parse a supplier Excel file on disk and smart-update the company's products
+    
+    Parsed products are spooled to a JSON-lines file and streamed back into the
+    bulk writer, so memory stays flat for large price lists. A parse cached by
+    the preview endpoint is passed as parsed and imported without re-parsing.
+    """
+    try:
+        if not parsed:
+            if job:
+                job.phase = "parsing"
+            parsed = await parse_excel_upload(company, file_path)
+        return await _import_spooled_products(company, filename, parsed, user_selected_currency,
+                                              discount_percentage, job, upload_id)
+    finally:
+        if parsed:
+            remove_file(parsed['spool_path'])
+
+async def _import_spooled_products(company: Dict[str, Any], filename: str, parsed: Dict[str, Any],
+                                   user_selected_currency: Optional[str], discount_percentage: float,
+                                   job: Optional["ImportJob"], upload_id: Optional[str],
+                                   dry_run: bool = False) -> Dict[str, Any]:
+    """Diff the spooled products against the company's products and write the changes
+    
+    With dry_run nothing is written; the would-be changes are returned instead.
+    """
+    company_id = company['id']
+    spool_path = parsed['spool_path']
+    product_count = parsed['product_count']
+    
+    # Every row of this upload converts with the same rates
+    rate_snapshot = await currency_service.snapshot_rates()
+    
+    # Initialize counters and tracking
+    new_products = 0
+    updated_products = 0
+    unchanged_products = 0
+    price_changes = []
+    currency_distribution = {}
+    
+    # Get existing products for this company for comparison
+    existing_products_cursor = db.products.find({"company_id": company_id}, {"_id": 0, "id": 1, "name": 1, "description": 1, "list_price": 1, "import_hash": 1})
+    existing_products = {product['name']: product async for product in existing_products_cursor}
+    seen_product_names = set()
+    unchanged_product_ids = []
+    
+    # Company lookups for color-based parsing, cached for this upload
+    company_cache = {company['name']: company['id']}
+    new_company_names = []
+    
+    # Pending product documents (product id to update, document) with their
+    # bookkeeping (is_new, price_change, product name); TRY prices are filled in at flush
+    batch_docs = []
+    batch_meta = []
+    batch_update_ids = set()
+    # Dry runs list the affected products instead of writing them
+    new_product_names = []
+    updated_product_names = []
+    
+    async def flush_batch():
+        """Write the pending batch in one round trip; failed rows are skipped like before"""
+        nonlocal new_products, updated_products
+        if not batch_docs:
+            return
+        documents = [document for _, document in batch_docs]
+        currencies = [document['currency'] for document in documents]
+        list_prices_try = currency_service.convert_batch_to_try(
+            [document['list_price'] for document in documents], currencies, rate_snapshot)
+        discounted_prices_try = currency_service.convert_batch_to_try(
+            [document['discounted_price'] or np.nan for document in documents], currencies, rate_snapshot)
+        for document, list_price_try, discounted_price_try in zip(documents, list_prices_try, discounted_prices_try):
+            document['list_price_try'] = float(list_price_try)
+            document['discounted_price_try'] = None if np.isnan(discounted_price_try) else float(discounted_price_try)
+        batch_ops = [UpdateOne({"id": product_id}, {"$set": document}) if product_id else InsertOne(document)
+                     for product_id, document in batch_docs]
+        failed_indexes = set()
         try:
-            if discount and discount.strip():
-                discount_percentage = float(discount)
-                if discount_percentage < 0 or discount_percentage > 100:
-                    raise ValueError("Discount must be between 0 and 100")
-                logger.info(f"User selected discount: {discount_percentage}%")
-        except ValueError as e:
-            logger.error(f"Invalid discount value: {discount}, error: {e}")
-            raise HTTPException(status_code=400, detail=f"Geçersiz iskonto değeri: {discount}")
-        
-        # Get current exchange rates
-        await currency_service.get_exchange_rates()
-        
-        # Initialize counters and tracking
-        new_products = 0
-        updated_products = 0
-        price_changes = []
-        currency_distribution = {}
-        created_products = []
-        
-        # Get existing products for this company for comparison
-        existing_products_cursor = db.products.find({"company_id": company_id})
-        existing_products = {product['name']: product async for product in existing_products_cursor}
-        
-        # Process and save products with smart update
-        for product_data in products_data:
-            try:
-                # Handle company management for color-based parsing
-                target_company_id = company_id
-                target_company_name = company['name']
+            if not dry_run:
+                await db.products.bulk_write(batch_ops, ordered=False)
+        except BulkWriteError as bwe:
+            write_errors = bwe.details.get("writeErrors", [])
+            failed_indexes = {error["index"] for error in write_errors}
+            for error in write_errors[:5]:
+                logger.warning(f"Error saving product in bulk write: {error.get('errmsg')}")
+        for index, (is_new, price_change, product_name) in enumerate(batch_meta):
+            if index in failed_indexes:
+                continue
+            if is_new:
+                new_products += 1
+            else:
+                updated_products += 1
+            if dry_run:
+                (new_product_names if is_new else updated_product_names).append(product_name)
+            else:
+                product_id, document = batch_docs[index]
+                index_products([{"id": product_id or document["id"], "search_key": document["search_key"]}])
+            if price_change:
+                price_changes.append(price_change)
+        batch_docs.clear()
+        batch_meta.clear()
+        batch_update_ids.clear()
+    
+    # Process and save products with smart update
+    if job:
+        job.phase = "writing"
+        job.rows_total = product_count
+        job.writing_started_at = time.time()
+    async for product_data in iter_spooled_products(spool_path):
+        if job:
+            job.rows_processed += 1
+        try:
+            # Handle company management for color-based parsing
+            target_company_id = company_id
+            
+            # If product has a different company name (from color-based parsing)
+            product_company_name = product_data.get('company_name')
+            if (product_company_name and 
+                product_company_name != company['name'] and
+                product_company_name != "Unknown"):
                 
-                # If product has a different company name (from color-based parsing)
-                if (product_data.get('company_name') and 
-                    product_data['company_name'] != company['name'] and
-                    product_data['company_name'] != "Unknown"):
-                    
+                if product_company_name not in company_cache:
                     # Check if this company already exists
-                    existing_company = await db.companies.find_one({"name": product_data['company_name']})
+                    existing_company = await db.companies.find_one({"name": product_company_name})
                     if existing_company:
-                        target_company_id = existing_company['id']
-                        target_company_name = existing_company['name']
+                        company_cache[product_company_name] = existing_company['id']
+                    elif dry_run:
+                        company_cache[product_company_name] = None
+                        new_company_names.append(product_company_name)
                     else:
                         # Create new company
                         new_company_dict = {
                             "id": str(uuid.uuid4()),
-                            "name": product_data['company_name'],
+                            "name": product_company_name,
                             "created_at": datetime.now(timezone.utc)
                         }
                         await db.companies.insert_one(new_company_dict)
-                        target_company_id = new_company_dict['id']
-                        target_company_name = new_company_dict['name']
-                        logger.info(f"Created new company: {product_data['company_name']}")
-                
-                # Use user-selected currency if provided, otherwise use detected currency
-                final_currency = user_selected_currency if user_selected_currency else product_data.get('currency', 'USD')
-                
-                # Apply discount if specified
-                original_list_price = Decimal(str(product_data['list_price']))
-                list_price = original_list_price  # Liste fiyatı orijinal fiyat olarak kalır
-                
-                # Calculate discounted price based on user discount percentage
-                discounted_price = None
-                if discount_percentage > 0:
-                    # İskonto yüzdesi varsa, orijinal fiyattan indirim yap
-                    discount_amount = original_list_price * (Decimal(str(discount_percentage)) / Decimal('100'))
-                    discounted_price = original_list_price - discount_amount
-                    logger.info(f"Applied {discount_percentage}% discount: {original_list_price} -> {discounted_price}")
-                elif product_data.get('discounted_price'):
-                    # Excel'de zaten indirimli fiyat varsa onu kullan
-                    discounted_price = Decimal(str(product_data['discounted_price']))
+                        company_cache[product_company_name] = new_company_dict['id']
+                        logger.info(f"Created new company: {product_company_name}")
+                target_company_id = company_cache[product_company_name]
+            
+            # Use user-selected currency if provided, otherwise use detected currency
+            final_currency = user_selected_currency if user_selected_currency else product_data.get('currency', 'USD')
+            
+            # Apply discount if specified
+            original_list_price = Decimal(str(product_data['list_price']))
+            list_price = original_list_price  # Liste fiyatı orijinal fiyat olarak kalır
+            
+            # Calculate discounted price based on user discount percentage
+            discounted_price = None
+            if discount_percentage > 0:
+                # İskonto yüzdesi varsa, orijinal fiyattan indirim yap
+                discount_amount = original_list_price * (Decimal(str(discount_percentage)) / Decimal('100'))
+                discounted_price = original_list_price - discount_amount
+            elif product_data.get('discounted_price'):
+                # Excel'de zaten indirimli fiyat varsa onu kullan
+                discounted_price = Decimal(str(product_data['discounted_price']))
+            
+            # Count currency distribution (use final currency)
+            currency = final_currency
+            currency_distribution[currency] = currency_distribution.get(currency, 0) + 1
+            
+            brand = product_data.get('brand', '')
+            import_hash = product_import_hash(brand, float(list_price),
+                                              float(discounted_price) if discounted_price else None, final_currency)
+            
+            # Check if product already exists (by name and company)
+            product_name = product_data['name']
+            existing_product = existing_products.get(product_name)
+            if existing_product:
+                seen_product_names.add(product_name)
+                # Same row as the last upload - nothing to write
+                if existing_product.get('import_hash') == import_hash:
+                    unchanged_products += 1
+                    unchanged_product_ids.append(existing_product['id'])
+                    continue
+            
+            if existing_product:
+                # Product exists - update it
+                old_list_price = float(existing_product.get('list_price', 0))
                 
-                # Convert prices to TRY
-                list_price_try = await currency_service.convert_to_try(list_price, final_currency)
+                # Calculate price change
+                new_list_price = float(list_price)
+                price_change = None
+                if old_list_price != new_list_price:
+                    price_change_amount = new_list_price - old_list_price
+                    price_change_percent = ((new_list_price - old_list_price) / old_list_price * 100) if old_list_price > 0 else 0
+                    
+                    price_change = {
+                        "product_name": product_name,
+                        "old_price": old_list_price,
+                        "new_price": new_list_price,
+                        "change_amount": price_change_amount,
+                        "change_percent": round(price_change_percent, 2),
+                        "currency": currency,
+                        "change_type": "increase" if price_change_amount > 0 else "decrease"
+                    }
                 
-                discounted_price_try = None
-                if discounted_price:
-                    discounted_price_try = await currency_service.convert_to_try(discounted_price, final_currency)
+                # Update existing product
+                update_data = {
+                    "brand": brand,  # Marka güncellemesi
+                    "list_price": float(list_price),
+                    "discounted_price": float(discounted_price) if discounted_price else None,
+                    "currency": final_currency,
+                    "import_hash": import_hash,
+                    "search_key": product_search_key({**existing_product, "brand": brand}),
+                    "updated_at": datetime.now(timezone.utc)
+                }
                 
-                # Count currency distribution (use final currency)
-                currency = final_currency
-                currency_distribution[currency] = currency_distribution.get(currency, 0) + 1
+                # Unordered bulk writes don't keep row order; a repeated row for the
+                # same product goes into the next batch so the last row still wins
+                if existing_product['id'] in batch_update_ids:
+                    await flush_batch()
+                batch_update_ids.add(existing_product['id'])
+                batch_docs.append((existing_product['id'], update_data))
+                batch_meta.append((False, price_change, product_name))
+                # A repeated row compares against what this upload just wrote
+                existing_product['import_hash'] = import_hash
                 
-                # Check if product already exists (by name and company)
-                product_name = product_data['name']
-                if product_name in existing_products:
-                    # Product exists - update it
-                    existing_product = existing_products[product_name]
-                    old_list_price = float(existing_product.get('list_price', 0))
-                    new_list_price = float(product_data['list_price'])
-                    
-                    # Calculate price change
-                    new_list_price = float(list_price)
-                    if old_list_price != new_list_price:
-                        price_change_amount = new_list_price - old_list_price
-                        price_change_percent = ((new_list_price - old_list_price) / old_list_price * 100) if old_list_price > 0 else 0
-                        
-                        price_changes.append({
-                            "product_name": product_name,
-                            "old_price": old_list_price,
-                            "new_price": new_list_price,
-                            "change_amount": price_change_amount,
-                            "change_percent": round(price_change_percent, 2),
-                            "currency": currency,
-                            "change_type": "increase" if price_change_amount > 0 else "decrease"
-                        })
-                    
-                    # Update existing product
-                    update_data = {
-                        "brand": product_data.get('brand', ''),  # Marka güncellemesi
-                        "list_price": float(list_price),
-                        "discounted_price": float(discounted_price) if discounted_price else None,
-                        "currency": final_currency,
-                        "list_price_try": float(list_price_try),
-                        "discounted_price_try": float(discounted_price_try) if discounted_price_try else None,
-                        "updated_at": datetime.now(timezone.utc)
-                    }
-                    
-                    await db.products.update_one(
-                        {"id": existing_product['id']},
-                        {"$set": update_data}
-                    )
-                    updated_products += 1
-                    
-                else:
-                    # New product - create it
-                    product_dict = {
-                        "id": str(uuid.uuid4()),
-                        "name": product_data['name'],
-                        "company_id": target_company_id,
-                        "brand": product_data.get('brand', ''),  # Marka alanı
-                        "description": product_data.get('description'),
-                        "image_url": None,
-                        "list_price": float(list_price),
-                        "discounted_price": float(discounted_price) if discounted_price else None,
-                        "currency": final_currency,
-                        "list_price_try": float(list_price_try),
-                        "discounted_price_try": float(discounted_price_try) if discounted_price_try else None,
-                        "created_at": datetime.now(timezone.utc)
-                    }
-                    
-                    await db.products.insert_one(product_dict)
-                    created_products.append(Product(**product_dict))
-                    new_products += 1
+            else:
+                # New product - create it
+                product_dict = {
+                    "id": str(uuid.uuid4()),
+                    "name": product_data['name'],
+                    "company_id": target_company_id,
+                    "brand": brand,  # Marka alanı
+                    "description": product_data.get('description'),
+                    "image_url": None,
+                    "list_price": float(list_price),
+                    "discounted_price": float(discounted_price) if discounted_price else None,
+                    "currency": final_currency,
+                    "import_hash": import_hash,
+                    "created_at": datetime.now(timezone.utc)
+                }
+                product_dict["search_key"] = product_search_key(product_dict)
                 
-            except Exception as e:
-                logger.warning(f"Error processing product {product_data.get('name', 'Unknown')}: {e}")
-                continue
-        
-        # Create upload history record
-        upload_history = {
-            "id": str(uuid.uuid4()),
-            "company_id": company_id,
-            "company_name": company['name'],
-            "filename": file.filename,
-            "upload_date": datetime.now(timezone.utc),
-            "total_products": len(products_data),
-            "new_products": new_products,
-            "updated_products": updated_products,
-            "currency_distribution": currency_distribution,
+                batch_docs.append((None, product_dict))
+                batch_meta.append((True, None, product_name))
+            
+            if len(batch_docs) >= EXCEL_IMPORT_BATCH_SIZE:
+                await flush_batch()
+            
+        except Exception as e:
+            logger.warning(f"Error processing product {product_data.get('name', 'Unknown')}: {e}")
+            continue
+    
+    await flush_batch()
+    
+    # Unchanged rows skipped the write; their TRY prices still follow the snapshot rates
+    if unchanged_product_ids and not dry_run:
+        await reprice_products({"id": {"$in": unchanged_product_ids}}, rate_snapshot)
+    
+    # Products of this company that were not in the uploaded list
+    missing_products = len(existing_products.keys() - seen_product_names)
+    
+    # Create detailed response message
+    messages = []
+    if new_products > 0:
+        messages.append(f"{new_products} yeni ürün eklendi")
+    if updated_products > 0:
+        messages.append(f"{updated_products} ürün güncellendi")
+    if unchanged_products > 0:
+        messages.append(f"{unchanged_products} ürün değişmedi")
+    if missing_products > 0:
+        messages.append(f"{missing_products} ürün listede yok")
+    if price_changes:
+        price_increases = len([c for c in price_changes if c['change_type'] == 'increase'])
+        price_decreases = len([c for c in price_changes if c['change_type'] == 'decrease'])
+        if price_increases > 0:
+            messages.append(f"{price_increases} ürünün fiyatı zamlandı")
+        if price_decreases > 0:
+            messages.append(f"{price_decreases} ürünün fiyatı ucuzladı")
+    
+    message = ". ".join(messages) if messages else "Liste başarıyla yüklendi"
+    
+    summary = {
+        "total_products": product_count,
+        "new_products": new_products,
+        "updated_products": updated_products,
+        "unchanged_products": unchanged_products,
+        "missing_products": missing_products,
+        "price_changes": len(price_changes),
+        "currency_distribution": currency_distribution
+    }
+    
+    if dry_run:
+        return {
+            "success": True,
+            "message": message,
+            "summary": summary,
+            "new_product_names": new_product_names,
+            "updated_product_names": updated_product_names,
             "price_changes": price_changes,
-            "status": "completed"
+            "new_companies": new_company_names
         }
+    
+    # Remember the format so the next list from this company skips format detection
+    if parsed['fingerprint'] and parsed['fingerprint'] != (company.get('excel_format') or {}).get('fingerprint'):
+        await db.companies.update_one({"id": company_id}, {"$set": {"excel_format": {
+            "name": parsed['format'],
+            "fingerprint": parsed['fingerprint'],
+            "updated_at": datetime.now(timezone.utc)
+        }}})
+    
+    # Create upload history record
+    upload_history = {
+        "id": upload_id or str(uuid.uuid4()),
+        "company_id": company_id,
+        "company_name": company['name'],
+        "filename": filename,
+        "upload_date": datetime.now(timezone.utc),
+        "total_products": product_count,
+        "new_products": new_products,
+        "updated_products": updated_products,
+        "unchanged_products": unchanged_products,
+        "missing_products": missing_products,
+        "currency_distribution": currency_distribution,
+        "price_changes": price_changes,
+        "excel_format": parsed['format'],
+        "rate_snapshot": {
+            "id": rate_snapshot['id'],
+            "rates": {currency: float(rate) for currency, rate in rate_snapshot['rates'].items()},
+            "taken_at": rate_snapshot['taken_at']
+        },
+        "status": "completed"
+    }
+    
+    # Background jobs already created a "processing" record under upload_id
+    await db.upload_history.update_one({"id": upload_history["id"]}, {"$set": upload_history}, upsert=True)
+    invalidate_cache("products", "companies")
+    
+    return {
+        "success": True,
+        "message": message,
+        "upload_id": upload_history["id"],
+        "summary": summary
+    }
+
+# Background import jobs - state is kept in memory, upload_history is the durable record
+IMPORT_UPLOAD_DIR = Path(os.environ.get('IMPORT_UPLOAD_DIR', ROOT_DIR / 'import_uploads'))
+IMPORT_JOBS_MAX_KEPT = 100
+# Parses kept by the preview endpoint for the following commit
+EXCEL_PREVIEW_TTL = int(os.environ.get('EXCEL_PREVIEW_TTL', 1800))  # seconds
+EXCEL_PREVIEW_MAX_KEPT = int(os.environ.get('EXCEL_PREVIEW_MAX_KEPT', 10))
+
+class ImportJob:
+    """Progress of one background Excel import"""
+
+    def __init__(self, company: Dict[str, Any], filename: str, file_path: Optional[Path],
+                 user_selected_currency: Optional[str], discount_percentage: float,
+                 parsed: Optional[Dict[str, Any]] = None):
+        self.id = str(uuid.uuid4())
+        self.upload_id = str(uuid.uuid4())
+        self.company = company
+        self.filename = filename
+        self.file_path = file_path
+        self.parsed = parsed
+        self.user_selected_currency = user_selected_currency
+        self.discount_percentage = discount_percentage
+        self.phase = "queued"  # queued, parsing, writing, completed, failed
+        self.rows_total = 0
+        self.rows_processed = 0
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.writing_started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+
+    def eta_seconds(self) -> Optional[float]:
+        """Remaining time estimate based on the write rate so far"""
+        if self.phase != "writing" or not self.rows_processed:
+            return None
+        elapsed = time.time() - self.writing_started_at
+        return round(elapsed / self.rows_processed * (self.rows_total - self.rows_processed), 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "upload_id": self.upload_id,
+            "company_id": self.company['id'],
+            "company_name": self.company['name'],
+            "filename": self.filename,
+            "phase": self.phase,
+            "rows_total": self.rows_total,
+            "rows_processed": self.rows_processed,
+            "eta_seconds": self.eta_seconds(),
+            "created_at": self.created_at,
+            "elapsed_seconds": round((self.finished_at or time.time()) - self.started_at, 1) if self.started_at else None,
+            "error": self.error,
+            "result": self.result
+        }
+
+import_jobs = OrderedDict()  # job id -> ImportJob, oldest first
+import_job_queue = asyncio.Queue()
+import_job_worker_task = None
+
+def enqueue_import_job(job: ImportJob):
+    """Queue a job and make sure the worker task is running"""
+    global import_job_worker_task
+    import_jobs[job.id] = job
+    # Forget the oldest finished jobs
+    for old_id in list(import_jobs)[:max(0, len(import_jobs) - IMPORT_JOBS_MAX_KEPT)]:
+        if import_jobs[old_id].phase in ("completed", "failed"):
+            del import_jobs[old_id]
+    import_job_queue.put_nowait(job)
+    if import_job_worker_task is None or import_job_worker_task.done():
+        import_job_worker_task = asyncio.create_task(import_job_worker())
+
+async def import_job_worker():
+    """Run queued imports one at a time - the Pi has little memory to spare"""
+    while True:
+        job = await import_job_queue.get()
+        try:
+            await run_import_job(job)
+        finally:
+            import_job_queue.task_done()
+
+async def run_import_job(job: ImportJob):
+    job.started_at = time.time()
+    try:
+        job.result = await import_excel_products(
+            job.company, job.filename, job.file_path,
+            job.user_selected_currency, job.discount_percentage,
+            job=job, upload_id=job.upload_id, parsed=job.parsed
+        )
+        job.phase = "completed"
+        logger.info(f"Import job {job.id} completed: {job.result['message']}")
+    except Exception as e:
+        job.phase = "failed"
+        job.error = e.detail if isinstance(e, HTTPException) else f"Excel dosyası yüklenemedi: {str(e)}"
+        logger.error(f"Import job {job.id} failed: {job.error}")
+        try:
+            await db.upload_history.update_one({"id": job.upload_id}, {"$set": {"status": "failed"}})
+        except Exception as db_error:
+            logger.error(f"Could not mark upload {job.upload_id} as failed: {db_error}")
+    finally:
+        job.finished_at = time.time()
+        if job.file_path:
+            remove_file(job.file_path)
+
+async def recover_interrupted_imports():
+    """Jobs live in memory; mark uploads left "processing" by a restart as failed"""
+    try:
+        result = await db.upload_history.update_many({"status": "processing"}, {"$set": {"status": "failed"}})
+        if result.modified_count:
+            logger.warning(f"{result.modified_count} interrupted Excel imports marked as failed")
+        for leftover in IMPORT_UPLOAD_DIR.glob("*"):
+            remove_file(leftover)
+    except Exception as e:
+        logger.error(f"Error recovering interrupted imports: {e}")
+
+excel_previews = OrderedDict()  # (company id, file sha256) -> parse result with its spool, oldest first
+
+def expire_excel_previews():
+    """Drop previews past their TTL or beyond the kept count, with their spool files"""
+    now = time.time()
+    for key in list(excel_previews):
+        preview = excel_previews[key]
+        if len(excel_previews) > EXCEL_PREVIEW_MAX_KEPT or now - preview['created_at'] > EXCEL_PREVIEW_TTL:
+            del excel_previews[key]
+            remove_file(preview['parsed']['spool_path'])
+
+def take_excel_preview(company_id: str, file_hash: str, options: Optional[tuple] = None) -> Optional[Dict[str, Any]]:
+    """Remove and return a cached preview; the caller owns its spool file from then on
+    
+    With options (currency, discount) only a preview made with the same options is taken.
+    """
+    expire_excel_previews()
+    preview = excel_previews.get((company_id, file_hash))
+    if not preview:
+        return None
+    if options is not None and options != (preview['user_selected_currency'], preview['discount_percentage']):
+        return None
+    return excel_previews.pop((company_id, file_hash))
+
+def save_upload_file(upload_file, path: Path) -> str:
+    """Copy an upload to disk, returning its sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as target:
+        while chunk := upload_file.read(1024 * 1024):
+            digest.update(chunk)
+            target.write(chunk)
+    return digest.hexdigest()
+
+def parse_upload_options(currency: Optional[str], discount: Optional[str]):
+    """Validate the currency override and discount form fields"""
+    # Handle user-selected currency override
+    user_selected_currency = None
+    if currency and currency.upper() in ['USD', 'EUR', 'TRY']:
+        user_selected_currency = currency.upper()
+        logger.info(f"User selected currency override: {user_selected_currency}")
+    
+    # Handle discount percentage
+    discount_percentage = 0.0
+    try:
+        if discount and discount.strip():
+            discount_percentage = float(discount)
+            if discount_percentage < 0 or discount_percentage > 100:
+                raise ValueError("Discount must be between 0 and 100")
+            logger.info(f"User selected discount: {discount_percentage}%")
+    except ValueError as e:
+        logger.error(f"Invalid discount value: {discount}, error: {e}")
+        raise HTTPException(status_code=400, detail=f"Geçersiz iskonto değeri: {discount}")
+    return user_selected_currency, discount_percentage
+
+async def store_excel_upload(file: UploadFile):
+    """Check the file type and copy the upload to disk; returns (path, sha256)"""
+    if not file.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="Sadece Excel dosyaları (.xlsx, .xls) kabul edilir")
+    
+    # Copy the upload to disk without reading it into memory; the parsers read it from there
+    IMPORT_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    file_path = IMPORT_UPLOAD_DIR / f"{uuid.uuid4()}{Path(file.filename).suffix}"
+    file_hash = await asyncio.to_thread(save_upload_file, file.file, file_path)
+    return file_path, file_hash
+
+async def start_excel_import(company: Dict[str, Any], filename: str, file_path: Optional[Path],
+                             user_selected_currency: Optional[str], discount_percentage: float,
+                             background: bool, parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Import inline, or hand the stored file (or cached parse) to the import worker"""
+    if not background:
+        try:
+            return await import_excel_products(company, filename, file_path, user_selected_currency,
+                                               discount_percentage, parsed=parsed)
+        finally:
+            if file_path:
+                remove_file(file_path)
+    
+    job = ImportJob(company, filename, file_path, user_selected_currency, discount_percentage, parsed)
+    
+    await db.upload_history.insert_one({
+        "id": job.upload_id,
+        "company_id": company['id'],
+        "company_name": company['name'],
+        "filename": filename,
+        "upload_date": datetime.now(timezone.utc),
+        "total_products": 0,
+        "new_products": 0,
+        "updated_products": 0,
+        "currency_distribution": {},
+        "price_changes": [],
+        "status": "processing"
+    })
+    enqueue_import_job(job)
+    
+    return {
+        "success": True,
+        "message": "Liste yükleniyor, işlem arka planda devam ediyor",
+        "job_id": job.id,
+        "upload_id": job.upload_id,
+        "status": "processing"
+    }
+
+@api_router.post("/companies/{company_id}/upload-excel")  
+async def upload_excel(company_id: str, file: UploadFile = File(...), currency: str = Form(None), discount: str = Form("0"),
+                       background: bool = Form(True)):
+    """Upload Excel file for a company with smart update system
+    
+    By default the import runs as a background job and the response carries a
+    job_id to poll at /api/import-jobs/{job_id}; background=false imports inline.
+    A file previewed before with the same currency and discount is not parsed again.
+    """
+    try:
+        # Verify company exists
+        company = await db.companies.find_one({"id": company_id})
+        if not company:
+            raise HTTPException(status_code=404, detail="Firma bulunamadı")
         
-        await db.upload_history.insert_one(upload_history)
+        user_selected_currency, discount_percentage = parse_upload_options(currency, discount)
+        file_path, file_hash = await store_excel_upload(file)
         
-        # Create detailed response message
-        messages = []
-        if new_products > 0:
-            messages.append(f"{new_products} yeni ürün eklendi")
-        if updated_products > 0:
-            messages.append(f"{updated_products} ürün güncellendi")
-        if price_changes:
-            price_increases = len([c for c in price_changes if c['change_type'] == 'increase'])
-            price_decreases = len([c for c in price_changes if c['change_type'] == 'decrease'])
-            if price_increases > 0:
-                messages.append(f"{price_increases} ürünün fiyatı zamlandı")
-            if price_decreases > 0:
-                messages.append(f"{price_decreases} ürünün fiyatı ucuzladı")
+        preview = take_excel_preview(company_id, file_hash, (user_selected_currency, discount_percentage))
+        if preview:
+            remove_file(file_path)
+            return await start_excel_import(company, file.filename, None, user_selected_currency,
+                                            discount_percentage, background, preview['parsed'])
+        return await start_excel_import(company, file.filename, file_path, user_selected_currency,
+                                        discount_percentage, background)
         
-        message = ". ".join(messages) if messages else "Liste başarıyla yüklendi"
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error uploading Excel file: {e}")
+        raise HTTPException(status_code=500, detail=f"Excel dosyası yüklenemedi: {str(e)}")
+
+@api_router.post("/companies/{company_id}/upload-excel/preview")
+async def preview_excel_upload(company_id: str, file: UploadFile = File(...), currency: str = Form(None),
+                               discount: str = Form("0")):
+    """Dry run of upload-excel: the inserts, updates and price changes it would make
+    
+    The parse is kept for EXCEL_PREVIEW_TTL seconds under the file's sha256
+    (preview_id); upload-excel/commit imports it without parsing again.
+    """
+    try:
+        company = await db.companies.find_one({"id": company_id})
+        if not company:
+            raise HTTPException(status_code=404, detail="Firma bulunamadı")
         
-        return {
-            "success": True,
-            "message": message,
-            "upload_id": upload_history["id"],
-            "summary": {
-                "total_products": len(products_data),
-                "new_products": new_products,
-                "updated_products": updated_products,
-                "price_changes": len(price_changes),
-                "currency_distribution": currency_distribution
-            }
-        }
+        user_selected_currency, discount_percentage = parse_upload_options(currency, discount)
+        file_path, file_hash = await store_excel_upload(file)
+        
+        try:
+            preview = take_excel_preview(company_id, file_hash)
+            if not preview:
+                preview = {"parsed": await parse_excel_upload(company, file_path)}
+        finally:
+            remove_file(file_path)
+        
+        # Stored only after the dry run: until then no other request can take or expire the spool
+        try:
+            result = await _import_spooled_products(company, file.filename, preview['parsed'], user_selected_currency,
+                                                    discount_percentage, None, None, dry_run=True)
+        except Exception:
+            remove_file(preview['parsed']['spool_path'])
+            raise
+        preview.update({
+            "filename": file.filename,
+            "user_selected_currency": user_selected_currency,
+            "discount_percentage": discount_percentage,
+            "created_at": time.time()
+        })
+        # A concurrent preview of the same file may have stored its own parse meanwhile
+        replaced = excel_previews.pop((company_id, file_hash), None)
+        if replaced and replaced['parsed'] is not preview['parsed']:
+            remove_file(replaced['parsed']['spool_path'])
+        excel_previews[(company_id, file_hash)] = preview
+        expire_excel_previews()
+        
+        result["preview_id"] = file_hash
+        result["excel_format"] = preview['parsed']['format']
+        return result
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error uploading Excel file: {e}")
+        logger.error(f"Error previewing Excel file: {e}")
+        raise HTTPException(status_code=500, detail=f"Excel dosyası önizlenemedi: {str(e)}")
+
+@api_router.post("/companies/{company_id}/upload-excel/commit")
+async def commit_excel_upload(company_id: str, preview_id: str = Form(...), background: bool = Form(True)):
+    """Import a previewed file with the currency and discount it was previewed with"""
+    try:
+        company = await db.companies.find_one({"id": company_id})
+        if not company:
+            raise HTTPException(status_code=404, detail="Firma bulunamadı")
+        
+        preview = take_excel_preview(company_id, preview_id)
+        if not preview:
+            raise HTTPException(status_code=404, detail="Önizleme bulunamadı veya süresi doldu, dosyayı tekrar yükleyin")
+        
+        return await start_excel_import(company, preview['filename'], None, preview['user_selected_currency'],
+                                        preview['discount_percentage'], background, preview['parsed'])
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error committing Excel preview: {e}")
         raise HTTPException(status_code=500, detail=f"Excel dosyası yüklenemedi: {str(e)}")
 
+@api_router.get("/import-jobs")
+async def get_import_jobs():
+    """Recent background import jobs, newest first"""
+    return [job.to_dict() for job in reversed(import_jobs.values())]
+
+@api_router.get("/import-jobs/{job_id}")
+async def get_import_job(job_id: str):
+    """Phase, progress and ETA of a background import job"""
+    job = import_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="İçe aktarma işi bulunamadı")
+    return job.to_dict()
+
+def encode_products_cursor(product: Dict[str, Any]) -> str:
+    """Opaque continuation token: the (is_favorite, name, id) sort key of the last product of a page"""
+    sort_key = [product.get("is_favorite"), product.get("name"), product.get("id")]
+    return base64.urlsafe_b64encode(json.dumps(sort_key, ensure_ascii=False).encode()).decode().rstrip("=")
+
+def products_after_cursor(cursor: str) -> Dict[str, Any]:
+    """Products sorted after the cursor under is_favorite desc, name asc, id asc"""
+    try:
+        is_favorite, name, product_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Geçersiz sayfa imleci")
+    clauses = [
+        {"is_favorite": is_favorite, "name": name, "id": {"$gt": product_id}},
+        {"is_favorite": is_favorite, "name": {"$gt": name}}
+    ]
+    # Descending is_favorite: true, then false, then null/missing
+    if is_favorite is True:
+        clauses.append({"is_favorite": {"$ne": True}})
+    elif is_favorite is not None:
+        clauses.append({"is_favorite": None})
+    return {"$or": clauses}
+
+def build_products_query(company_id: Optional[str], category_id: Optional[str], search: Optional[str]) -> Dict[str, Any]:
+    """Product filter shared by the list, count and page endpoints"""
+    query = {}
+    if company_id:
+        query["company_id"] = company_id
+    if category_id:
+        query["category_id"] = category_id
+    search_query = product_search_query(search)
+    if search_query:
+        # Token prefix search on the precomputed search_key (Turkish-folded, indexed)
+        query.update(search_query)
+    return query
+
+# Product counts per filter - kept apart from response_cache so they don't skew its stats or LRU
+PRODUCT_COUNT_CACHE_MAX_ENTRIES = 256
+product_count_cache = OrderedDict()  # filter signature -> (count, products tag version, stored_at)
+
+async def count_products(company_id: Optional[str], category_id: Optional[str], search: Optional[str],
+                         query: Dict[str, Any]) -> int:
+    """Count of products matching query, cached per filter until products change"""
+    # A punctuation-only search has no tokens but, unlike a blank one, matches nothing
+    searching = bool(search and search.strip())
+    cache_key = json.dumps([company_id, category_id, search_tokens(search), searching], ensure_ascii=False)
+    versions = response_cache.versions(("products",))
+    cached = product_count_cache.get(cache_key)
+    if cached and cached[1] == versions and time.time() - cached[2] < CACHE_DURATION:
+        product_count_cache.move_to_end(cache_key)
+        return cached[0]
+    
+    # Use estimated count for better performance on large collections
+    if not query:  # If no filters, use fast count
+        count = await db.products.estimated_document_count()
+    else:
+        count = await db.products.count_documents(query)
+    
+    # Not stored when a product write happened during the count
+    if response_cache.versions(("products",)) == versions:
+        product_count_cache[cache_key] = (count, versions, time.time())
+        product_count_cache.move_to_end(cache_key)
+        while len(product_count_cache) > PRODUCT_COUNT_CACHE_MAX_ENTRIES:
+            product_count_cache.popitem(last=False)
+    return count
+
+def product_list_fields(view: Optional[str], fields: Optional[str]) -> Optional[tuple]:
+    """Fields requested via view= or fields= (comma separated); None for whole documents"""
+    if fields:
+        selected = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+        if not selected or any(field not in ProductSummary.model_fields for field in selected):
+            raise HTTPException(status_code=400, detail="Geçersiz ürün alanı")
+        return selected if "id" in selected else ("id",) + selected
+    if view:
+        if view not in PRODUCT_LIST_VIEWS:
+            raise HTTPException(status_code=400, detail="Geçersiz ürün görünümü")
+        return PRODUCT_LIST_VIEWS[view]
+    return None
+
+async def list_products(query: Dict[str, Any], page: int, limit: int, skip_pagination: bool,
+                        cursor: Optional[str], fields: Optional[tuple] = None):
+    """One page of products, favorites first; returns (products, next page cursor)"""
+    if cursor:
+        query = {"$and": [query, products_after_cursor(cursor)]} if query else products_after_cursor(cursor)
+    
+    # FAVORI ÜRÜNLER ÖNCELİKLİ SIRALAMA: Aggregate ile güçlü sıralama
+    pipeline = []
+    
+    # Match stage - filtering
+    if query:
+        pipeline.append({"$match": query})
+    
+    # Sort stage - FAVORİLER ÖNCE! 
+    pipeline.append({
+        "$sort": {
+            "is_favorite": -1,  # True (-1) önce, False (0) sonra
+            "name": 1,          # Sonra alfabetik
+            "id": 1             # Aynı isimler için sabit sıra (keyset)
+        }
+    })
+    
+    # Pagination
+    if cursor is not None:
+        # One extra product tells whether there is a next page
+        pipeline.append({"$limit": limit + 1})
+    elif not skip_pagination:
+        skip = (page - 1) * limit
+        pipeline.extend([
+            {"$skip": skip},
+            {"$limit": limit}
+        ])
+    else:
+        pipeline.append({"$limit": 5000})  # Max limit
+    
+    if fields:
+        # Sort keys stay in the projection for the next page cursor
+        projection = dict.fromkeys(("is_favorite", "name", "id") + fields, 1)
+        pipeline.append({"$project": {"_id": 0, **projection}})
+    
+    # Execute aggregation pipeline
+    try:
+        products = await db.products.aggregate(pipeline).to_list(None)
+    except Exception as e:
+        logger.error(f"Error getting products: {e}")
+        # Fallback to basic query if optimization fails - same filter and order
+        skip = (page - 1) * limit if not skip_pagination and cursor is None else 0
+        query_limit = limit + 1 if cursor is not None else 5000 if skip_pagination else limit
+        projection = pipeline[-1]["$project"] if fields else None
+        products = await db.products.find(query, projection).sort(
+            [("is_favorite", -1), ("name", 1), ("id", 1)]).skip(skip).limit(query_limit).to_list(query_limit)
+    next_cursor = None
+    if cursor is not None and len(products) > limit:
+        products = products[:limit]
+        next_cursor = encode_products_cursor(products[-1])
+    
+    # Responses leave out unset fields; whole documents still get every Product default
+    optional_fields = [(name, field) for name, field in Product.model_fields.items() if not field.is_required()]
+    unrequested_keys = ({"is_favorite", "name", "id"} - set(fields)) if fields else ()
+    for product in products:
+        # Convert Decimal fields to float for JSON serialization
+        for field in ('list_price', 'discounted_price', 'list_price_try', 'discounted_price_try'):
+            if isinstance(product.get(field), Decimal):
+                product[field] = float(product[field])
+        if fields:
+            for key in unrequested_keys:
+                product.pop(key, None)
+            for key in fields:
+                product.setdefault(key, None)
+        else:
+            for name, field in optional_fields:
+                if name not in product:
+                    product[name] = field.get_default(call_default_factory=True)
+    return products, next_cursor
+
 @api_router.get("/products/count")
 async def get_products_count(
     company_id: Optional[str] = None,
@@ -4652,30 +6536,8 @@ async def get_products_count(
 ):
     """Get optimized total count of products with optional filters"""
     try:
-        query = {}
-        if company_id:
-            query["company_id"] = company_id
-        if category_id:
-            query["category_id"] = category_id
-        if search:
-            # Enhanced text search with index utilization (same as main endpoint)
-            search_term = search.strip()
-            if len(search_term) >= 2:  # Only search for 2+ characters for performance
-                query["$text"] = {"$search": search_term}
-            else:
-                # Fallback for short searches
-                query["$or"] = [
-                    {"name": {"$regex": f"^{search}", "$options": "i"}},
-                    {"brand": {"$regex": f"^{search}", "$options": "i"}}
-                ]
-            
-        # Use estimated count for better performance on large collections
-        if not query:  # If no filters, use fast count
-            count = await db.products.estimated_document_count()
-        else:
-            count = await db.products.count_documents(query)
-            
-        return {"count": count}
+        query = build_products_query(company_id, category_id, search)
+        return {"count": await count_products(company_id, category_id, search, query)}
     except Exception as e:
         logger.error(f"Error getting products count: {e}")
         # Fallback to basic count
@@ -4691,7 +6553,39 @@ async def get_products_count(
             logger.error(f"Fallback count query failed: {fallback_error}")
             raise HTTPException(status_code=500, detail="Ürün sayısı getirilemedi")
 
-@api_router.get("/products", response_model=List[Product])
+@api_router.get("/products/page", response_model=ProductPage, response_model_exclude_unset=True)
+async def get_products_page(
+    company_id: Optional[str] = None,
+    category_id: Optional[str] = None,
+    search: Optional[str] = None,
+    page: int = 1,
+    limit: int = 100,
+    skip_pagination: bool = False,
+    cursor: Optional[str] = None,
+    view: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Products and their total count in one request
+    
+    Takes the same parameters as /products. The list and the count run
+    concurrently; the count is cached per filter, so paging does not recount.
+    """
+    try:
+        query = build_products_query(company_id, category_id, search)
+        selected_fields = product_list_fields(view, fields)
+        (products, next_cursor), total = await asyncio.gather(
+            list_products(query, page, limit, skip_pagination, cursor, selected_fields),
+            count_products(company_id, category_id, search, query)
+        )
+        return {"products": products, "total": total, "page": page, "limit": limit, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting products page: {e}")
+        raise HTTPException(status_code=500, detail="Ürünler getirilemedi")
+
+@api_router.get("/products", response_model=Union[List[Product], List[ProductSummary]],
+                 response_model_exclude_unset=True)
 async def get_products(
     company_id: Optional[str] = None,
     category_id: Optional[str] = None,
@@ -4699,169 +6593,36 @@ async def get_products(
     page: int = 1,
     limit: int = 100,
     skip_pagination: bool = False,  # For backward compatibility
+    cursor: Optional[str] = None,
+    view: Optional[str] = None,
+    fields: Optional[str] = None,
+    response: Response = None,
     request: Request = None
 ):
-    """Get products with optimized pagination, filtering by company, category, or search term"""
+    """Get products with optimized pagination, filtering by company, category, or search term
+    
+    Passing cursor (empty for the first page) switches to keyset pagination: each
+    page costs the same at any depth and X-Next-Cursor carries the token of the
+    next page; it is absent on the last page. page and skip_pagination are ignored then.
+    
+    view (a PRODUCT_LIST_VIEWS profile such as picker) or fields (comma separated
+    names) return only those fields as ProductSummary items, projected in MongoDB.
+    """
     try:
-        query = {}
-        if company_id:
-            query["company_id"] = company_id
-        if category_id:
-            query["category_id"] = category_id
-        if search:
-            # Simple and accurate search implementation
-            search_term = search.strip()
-            if len(search_term) >= 1:
-                
-                # Turkish character mapping for better search
-                def normalize_turkish(text):
-                    """Normalize Turkish characters for search"""
-                    replacements = {
-                        'ç': 'c', 'ğ': 'g', 'ı': 'i', 'ö': 'o', 'ş': 's', 'ü': 'u',
-                        'Ç': 'C', 'Ğ': 'G', 'I': 'I', 'Ö': 'O', 'Ş': 'S', 'Ü': 'U'
-                    }
-                    for tr, en in replacements.items():
-                        text = text.replace(tr, en)
-                    return text
-                
-                # Prepare search patterns
-                normalized_search = normalize_turkish(search_term)
-                
-                # Create comprehensive but precise search
-                query["$or"] = [
-                    # 1. Exact search in name (case insensitive)
-                    {"name": {"$regex": search_term, "$options": "i"}},
-                    
-                    # 2. Normalized search (Turkish chars → English)
-                    {"name": {"$regex": normalized_search, "$options": "i"}},
-                    
-                    # 3. Search in description
-                    {"description": {"$regex": search_term, "$options": "i"}},
-                    
-                    # 4. Search in brand
-                    {"brand": {"$regex": search_term, "$options": "i"}},
-                    
-                    # 5. Normalized search in description
-                    {"description": {"$regex": normalized_search, "$options": "i"}},
-                    
-                    # 6. Normalized search in brand  
-                    {"brand": {"$regex": normalized_search, "$options": "i"}}
-                ]
-        
-        # FAVORI ÜRÜNLER ÖNCELİKLİ SIRALAMA: Aggregate ile güçlü sıralama
-        pipeline = []
+        query = build_products_query(company_id, category_id, search)
+        selected_fields = product_list_fields(view, fields)
+        products, next_cursor = await list_products(query, page, limit, skip_pagination, cursor, selected_fields)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
-        # Match stage - filtering
-        if query:
-            pipeline.append({"$match": query})
-        
-        # Sort stage - FAVORİLER ÖNCE! 
-        pipeline.append({
-            "$sort": {
-                "is_favorite": -1,  # True (-1) önce, False (0) sonra
-                "name": 1           # Sonra alfabetik
-            }
-        })
-        
-        # Pagination
-        if not skip_pagination:
-            skip = (page - 1) * limit
-            pipeline.extend([
-                {"$skip": skip},
-                {"$limit": limit}
-            ])
-        else:
-            pipeline.append({"$limit": 5000})  # Max limit
-        
-        # Execute aggregation pipeline
-        cursor = db.products.aggregate(pipeline)
-        products = await cursor.to_list(None)
-        
-        # Convert Decimal fields to float for JSON serialization
-        response_data = []
-        for product in products:
-            # Convert Decimal fields to float
-            if 'list_price' in product and isinstance(product['list_price'], Decimal):
-                product['list_price'] = float(product['list_price'])
-            if 'discounted_price' in product and isinstance(product['discounted_price'], Decimal):
-                product['discounted_price'] = float(product['discounted_price'])
-            if 'list_price_try' in product and isinstance(product['list_price_try'], Decimal):
-                product['list_price_try'] = float(product['list_price_try'])
-            if 'discounted_price_try' in product and isinstance(product['discounted_price_try'], Decimal):
-                product['discounted_price_try'] = float(product['discounted_price_try'])
-            
-            response_data.append(product)
-        
-        # PERFORMANCE: Cache invalidation for products to ensure fresh sorting
-        if not search:
-            response = JSONResponse(content=response_data)
-            response.headers["Cache-Control"] = "public, max-age=60"  # Kısa cache favori sıralama için
-        else:
-            response = JSONResponse(content=response_data)
-            response.headers["Cache-Control"] = "public, max-age=30"  # Arama için daha kısa
-            
-        return response
-            
+        # Cache-Control / ETag headers are set by cache_middleware
+        return products
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting products: {e}")
-        # Fallback to basic query if optimization fails
-        try:
-            basic_query = {}
-            if company_id:
-                basic_query["company_id"] = company_id
-            if category_id:
-                basic_query["category_id"] = category_id
-            
-            # CRITICAL FIX: Add search logic to fallback query
-            if search:
-                search_term = search.strip()
-                if len(search_term) >= 1:
-                    # Turkish character mapping for fallback search
-                    def normalize_turkish(text):
-                        replacements = {
-                            'ç': 'c', 'ğ': 'g', 'ı': 'i', 'ö': 'o', 'ş': 's', 'ü': 'u',
-                            'Ç': 'C', 'Ğ': 'G', 'I': 'I', 'Ö': 'O', 'Ş': 'S', 'Ü': 'U'
-                        }
-                        for tr, en in replacements.items():
-                            text = text.replace(tr, en)
-                        return text
-                    
-                    normalized_search = normalize_turkish(search_term)
-                    
-                    # Same search logic as main query
-                    basic_query["$or"] = [
-                        {"name": {"$regex": search_term, "$options": "i"}},
-                        {"name": {"$regex": normalized_search, "$options": "i"}},
-                        {"description": {"$regex": search_term, "$options": "i"}},
-                        {"brand": {"$regex": search_term, "$options": "i"}},
-                        {"description": {"$regex": normalized_search, "$options": "i"}},
-                        {"brand": {"$regex": normalized_search, "$options": "i"}}
-                    ]
-            
-            skip = (page - 1) * limit if not skip_pagination else 0
-            # IMPORTANT: Use the same sorting as aggregate pipeline - FAVORITES FIRST!
-            query_limit = 5000 if skip_pagination else limit
-            products = await db.products.find(basic_query).sort([("is_favorite", -1), ("name", 1)]).skip(skip).limit(query_limit).to_list(query_limit)
-            
-            # Convert Decimal fields to float for JSON serialization
-            response_data = []
-            for product in products:
-                # Convert Decimal fields to float
-                if 'list_price' in product and isinstance(product['list_price'], Decimal):
-                    product['list_price'] = float(product['list_price'])
-                if 'discounted_price' in product and isinstance(product['discounted_price'], Decimal):
-                    product['discounted_price'] = float(product['discounted_price'])
-                if 'list_price_try' in product and isinstance(product['list_price_try'], Decimal):
-                    product['list_price_try'] = float(product['list_price_try'])
-                if 'discounted_price_try' in product and isinstance(product['discounted_price_try'], Decimal):
-                    product['discounted_price_try'] = float(product['discounted_price_try'])
-                
-                response_data.append(product)
-            
-            return response_data
-        except Exception as fallback_error:
-            logger.error(f"Fallback query also failed: {fallback_error}")
-            raise HTTPException(status_code=500, detail="Ürünler getirilemedi")
+        raise HTTPException(status_code=500, detail="Ürünler getirilemedi")
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product: ProductCreate):
@@ -4888,6 +6649,7 @@ async def create_product(product: ProductCreate):
         product_data = jsonable_encoder(product.dict())
         product_data["id"] = str(uuid.uuid4())  
         product_data["created_at"] = datetime.now(timezone.utc)
+        product_data["search_key"] = product_search_key(product_data)
         
         # Convert prices to TRY
         if product.currency == 'USD':
@@ -4905,9 +6667,10 @@ async def create_product(product: ProductCreate):
         
         # Insert into database
         await db.products.insert_one(product_data)
+        index_products([product_data])
         
         # PERFORMANCE: Invalidate cache
-        invalidate_cache("/api/products")
+        invalidate_cache("products")
         
         return Product(**product_data)
         
@@ -4920,51 +6683,24 @@ async def create_product(product: ProductCreate):
 
 @api_router.post("/refresh-prices")
 async def refresh_prices():
-    """Refresh all product prices with current exchange rates"""
+    """Refresh all product prices with current exchange rates
+    
+    One update_many per currency multiplies the stored prices by the rate inside
+    MongoDB, so no product is loaded into the app.
+    """
     try:
         # Get fresh exchange rates
-        await currency_service.get_exchange_rates()
-        
-        # Get all products
-        products = await db.products.find().to_list(None)
-        updated_count = 0
-        
-        for product in products:
-            try:
-                if product['currency'] != 'TRY':
-                    # Convert prices to TRY
-                    list_price_try = await currency_service.convert_to_try(
-                        Decimal(str(product['list_price'])), 
-                        product['currency']
-                    )
-                    
-                    discounted_price_try = None
-                    if product.get('discounted_price'):
-                        discounted_price_try = await currency_service.convert_to_try(
-                            Decimal(str(product['discounted_price'])), 
-                            product['currency']
-                        )
-                    
-                    # Update product
-                    await db.products.update_one(
-                        {"id": product["id"]},
-                        {
-                            "$set": {
-                                "list_price_try": float(list_price_try),
-                                "discounted_price_try": float(discounted_price_try) if discounted_price_try else None
-                            }
-                        }
-                    )
-                    updated_count += 1
-                    
-            except Exception as e:
-                logger.warning(f"Error updating product {product.get('name', 'Unknown')}: {e}")
-                continue
+        rate_snapshot = await currency_service.snapshot_rates()
+        currency_counts = await reprice_products({}, rate_snapshot)
         
+        updated_count = sum(currency_counts.values())
+        invalidate_cache("products")
         return {
             "success": True,
             "message": f"{updated_count} ürünün fiyatı güncellendi",
-            "updated_count": updated_count
+            "updated_count": updated_count,
+            "currency_counts": currency_counts,
+            "rate_snapshot_id": rate_snapshot['id']
         }
         
     except Exception as e:
@@ -5102,6 +6838,7 @@ async def change_upload_currency(upload_id: str, new_currency: str):
                     "currency": new_currency,
                     "list_price": float(new_list_price),  # Same numeric value
                     "list_price_try": float(new_list_price_try),  # Recalculated for TRY
+                    "import_hash": None,
                     "updated_at": datetime.now(timezone.utc)
                 }
                 
@@ -5129,6 +6866,8 @@ async def change_upload_currency(upload_id: str, new_currency: str):
                 logger.warning(f"Error updating product {product.get('name', 'Unknown')}: {e}")
                 continue
         
+        invalidate_cache("products")
+        
         # Update upload history to reflect the currency change
         await db.upload_history.update_one(
             {"id": upload_id},
@@ -5355,6 +7094,7 @@ async def bulk_update_price(request: BulkUpdatePriceRequest):
             
             # Update price
             update_data[request.apply_to] = new_price
+            update_data["import_hash"] = None
             
             # Recalculate TRY prices
             currency = product.get("currency", "USD")
@@ -5372,6 +7112,7 @@ async def bulk_update_price(request: BulkUpdatePriceRequest):
             
             updated_count += 1
         
+        invalidate_cache("products")
         return {
             "success": True,
             "message": f"{updated_count} ürünün fiyatı güncellendi",
@@ -5402,6 +7143,7 @@ async def bulk_update_category(request: BulkUpdateCategoryRequest):
             {"id": {"$in": request.product_ids}},
             {"$set": {"category_id": request.category_id if request.category_id else None}}
         )
+        invalidate_cache("products")
         
         return {
             "success": True,
@@ -5445,6 +7187,7 @@ async def create_category_group(group_data: CategoryGroupCreate):
         }
         
         result = await db.category_groups.insert_one(group)
+        invalidate_cache("category_groups")
         # Remove MongoDB _id field for response
         group.pop('_id', None)
         return {"success": True, "message": "Kategori grubu oluşturuldu", "group": group}
@@ -5478,6 +7221,7 @@ async def update_category_group(group_id: str, group_data: CategoryGroupUpdate):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Kategori grubu bulunamadı")
+        invalidate_cache("category_groups")
             
         return {"success": True, "message": "Kategori grubu güncellendi"}
     except HTTPException:
@@ -5494,6 +7238,7 @@ async def delete_category_group(group_id: str):
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Kategori grubu bulunamadı")
+        invalidate_cache("category_groups")
             
         return {"success": True, "message": "Kategori grubu silindi"}
     except HTTPException:
@@ -5516,6 +7261,7 @@ async def reorder_category_groups(group_orders: List[Dict[str, Any]]):
                     {"id": group_id},
                     {"$set": {"sort_order": sort_order}}
                 )
+        invalidate_cache("category_groups")
         
         # Return updated category groups sorted by new order
         groups = []
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Excel Color Parse Benchmark
+Compares the original per-cell fill color detection with the memoized classifier
+(classification cache + row-level fast path) on the bundled supplier workbooks,
+and reports end-to-end color-based parse time. No database needed.
+
+Usage:
+    python excel_color_parse_benchmark.py
+"""
+
+import os
+import sys
+import time
+import statistics
+import logging
+from pathlib import Path
+
+ITERATIONS = 10
+ROOT = Path(__file__).parent
+WORKBOOKS = ["HAVENSIS_SOLAR.xlsx", "ELEKTROZIRVE.xlsx", "VENTA_LISTE.xlsx"]
+
+# server.py reads these at import time; no connection is made
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "excel_color_bench")
+sys.path.insert(0, str(ROOT / "backend"))
+
+
+def detect_color_category_before(fill):
+    """Original implementation: substring chain evaluated for every cell"""
+    if not fill or not hasattr(fill, 'start_color'):
+        return 'NONE'
+    color = fill.start_color
+    if hasattr(color, 'rgb') and color.rgb:
+        rgb = str(color.rgb).upper()
+        if 'FFFF0000' in rgb or 'FF0000' in rgb or 'CC0000' in rgb:
+            return 'RED'
+        elif 'FF0070C0' in rgb or '0070C0' in rgb or '0000FF' in rgb or '4472C4' in rgb:
+            return 'BLUE'
+        elif ('FFFFC000' in rgb or 'FFF4B183' in rgb or 'F4B183' in rgb or 'FF7F00' in rgb or 'FFA500' in rgb or
+              'FF8C00' in rgb or 'FFFF9900' in rgb or 'FF9900' in rgb):
+            return 'ORANGE'
+        elif 'FFFFFF00' in rgb or 'FFFF00' in rgb or 'FFC000' in rgb:
+            return 'YELLOW'
+        elif 'FF00B050' in rgb or '00B050' in rgb or '00FF00' in rgb or '008000' in rgb:
+            return 'GREEN'
+    if hasattr(color, 'theme') and color.theme is not None:
+        theme = color.theme
+        if theme == 2:
+            return 'RED'
+        elif theme == 4:
+            return 'BLUE'
+        elif theme == 5:
+            return 'YELLOW'
+        elif theme == 6:
+            return 'GREEN'
+        elif theme in (9, 7):
+            return 'ORANGE'
+    if hasattr(color, 'index') and color.index:
+        index = str(color.index)
+        if index in ['10', '3']:
+            return 'RED'
+        elif index in ['12', '5']:
+            return 'BLUE'
+        elif index in ['13', '6']:
+            return 'YELLOW'
+        elif index in ['11', '4']:
+            return 'GREEN'
+        elif index in ['46', '53', '9']:
+            return 'ORANGE'
+    return 'NONE'
+
+
+def classify_before(sheet):
+    """Per-cell lookup and classification, as the original parser did"""
+    return [detect_color_category_before(sheet.cell(row=r, column=c).fill)
+            for r in range(1, sheet.max_row + 1) for c in range(1, sheet.max_column + 1)]
+
+
+def classify_after(server, sheet):
+    """Row-level fast path backed by the classification cache"""
+    categories = []
+    for row in sheet.iter_rows():
+        categories.extend(server.classify_row_fills(row))
+    return categories
+
+
+def timed(func, iterations=ITERATIONS):
+    """Return (median ms, p95 ms)"""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[max(int(len(timings) * 0.95) - 1, 0)]
+
+
+def main():
+    import openpyxl
+    import server
+    logging.disable(logging.CRITICAL)
+
+    print(f"🎨 Excel color parse benchmark ({ITERATIONS} iterations)\n")
+    print(f"{'workbook':<22} {'cells':>6} | {'classify before':>15} {'after':>9} | {'parse median':>12} {'p95':>9} {'products':>8}")
+    for name in WORKBOOKS:
+        path = ROOT / name
+        if not path.exists():
+            print(f"{name:<22} missing, skipped")
+            continue
+        file_content = path.read_bytes()
+        workbook = openpyxl.load_workbook(path, data_only=True)
+        sheets = workbook.worksheets
+
+        cells = sum(sheet.max_row * sheet.max_column for sheet in sheets)
+        before = timed(lambda: [classify_before(sheet) for sheet in sheets])
+        after = timed(lambda: [classify_after(server, sheet) for sheet in sheets])
+        assert [classify_before(s) for s in sheets] == [classify_after(server, s) for s in sheets]
+
+        products = len(server.ColorBasedExcelService.parse_colored_excel(file_content, "Benchmark"))
+        parse = timed(lambda: server.ColorBasedExcelService.parse_colored_excel(file_content, "Benchmark"))
+        print(f"{name:<22} {cells:>6} | {before[0]:>13.2f}ms {after[0]:>7.2f}ms"
+              f" | {parse[0]:>10.2f}ms {parse[1]:>7.2f}ms {products:>8}")
+
+    info = server.classify_fill_color.cache_info()
+    print(f"\nclassification cache: {info.currsize} colors, {info.hits} hits, {info.misses} misses")
+
+
+if __name__ == "__main__":
+    main()
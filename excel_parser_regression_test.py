@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Excel Parser Regression Test
+Runs the row-by-row (iterrows) ELEKTROZİRVE, HAVENSİS and general format parsers
+and their vectorized replacements in server.ExcelService over a corpus of frames
+(bundled supplier workbooks plus synthetic edge cases) and checks that the
+outputs are identical, then compares their speed on large frames. No database needed.
+
+Usage:
+    python excel_parser_regression_test.py
+"""
+
+import os
+import sys
+import time
+import logging
+import statistics
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any
+
+import pandas as pd
+
+ROOT = Path(__file__).parent
+TIMING_ROWS = 20000
+ITERATIONS = 5
+
+# server.py reads these at import time; no connection is made
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "excel_parser_regression")
+sys.path.insert(0, str(ROOT / "backend"))
+
+logger = logging.getLogger("legacy_parsers")
+
+
+class LegacyExcelService:
+    """Parsers as they were before vectorization (reference implementation)"""
+
+    @staticmethod
+    def _parse_elektrozirve_format(df) -> List[Dict[str, Any]]:
+        """ELEKTROZİRVE formatında Excel parse et"""
+        products = []
+        
+        # İlk satır header (Güneş Panelleri, LİSTE FİYATI, İskonto, Net Fiyat)
+        df.columns = ['product_name', 'list_price', 'discount_rate', 'net_price']
+        
+        for index, row in df.iterrows():
+            try:
+                if index == 0:  # Header satırını atla
+                    continue
+                
+                product_name = str(row['product_name']).strip() if pd.notna(row['product_name']) else ""
+                list_price = float(row['list_price']) if pd.notna(row['list_price']) else 0
+                net_price = float(row['net_price']) if pd.notna(row['net_price']) else 0
+                
+                # Kategori başlıkları atla (örn: "Esnek Güneş Panelleri")
+                if ('panelleri' in product_name.lower() or 'aküler' in product_name.lower() or 
+                    'regülatörler' in product_name.lower()) and list_price == 0:
+                    continue
+                
+                # Geçerli ürün kontrolü
+                if (product_name and len(product_name) > 5 and 
+                    list_price > 0 and not product_name.lower().startswith('liste')):
+                    
+                    products.append({
+                        'name': product_name,
+                        'list_price': list_price,
+                        'currency': 'TRY',  # ELEKTROZİRVE TL fiyatları
+                        'discounted_price': net_price if net_price != list_price else None
+                    })
+                    logger.info(f"Added ELEKTROZİRVE product: {product_name[:50]}... - {list_price} TL")
+                    
+            except Exception as e:
+                logger.warning(f"Error processing ELEKTROZİRVE row {index}: {e}")
+                continue
+        
+        return products
+    
+    @staticmethod
+    def _parse_havensis_format(df) -> List[Dict[str, Any]]:
+        """HAVENSİS formatında Excel parse et"""
+        products = []
+        
+        # HAVENSİS formatı: Col3=Ürün, Col6=Fiyat$, Col7=İskonto, Col8=İskontolu Fiyat$
+        product_col = 3
+        price_col = 6
+        discount_rate_col = 7
+        discounted_price_col = 8
+        
+        for index, row in df.iterrows():
+            try:
+                if index < 12:  # İlk 12 satır header/boş satırlar
+                    continue
+                
+                # Ürün adı (Col3)
+                product_name = ""
+                if len(row) > product_col and pd.notna(row.iloc[product_col]):
+                    product_name = str(row.iloc[product_col]).strip()
+                
+                # Liste fiyatı (Col6)
+                list_price = 0
+                if len(row) > price_col and pd.notna(row.iloc[price_col]):
+                    try:
+                        list_price = float(row.iloc[price_col])
+                    except:
+                        list_price = 0
+                
+                # İndirimli fiyat (Col8)
+                discounted_price = None
+                if len(row) > discounted_price_col and pd.notna(row.iloc[discounted_price_col]):
+                    try:
+                        discounted_price = float(row.iloc[discounted_price_col])
+                    except:
+                        discounted_price = None
+                
+                # Geçerli ürün kontrolü
+                if (product_name and len(product_name) > 10 and 
+                    list_price > 0 and 'panel' in product_name.lower()):
+                    
+                    products.append({
+                        'name': product_name,
+                        'list_price': list_price,
+                        'currency': 'USD',  # HAVENSİS USD fiyatları
+                        'discounted_price': discounted_price
+                    })
+                    logger.info(f"Added HAVENSİS product: {product_name[:50]}... - ${list_price}")
+                    
+            except Exception as e:
+                logger.warning(f"Error processing HAVENSİS row {index}: {e}")
+                continue
+        
+        return products
+    
+    @staticmethod
+    def detect_currency_from_text(text: str, fallback_currency: str = 'USD') -> str:
+        """Detect currency from any text (header, cell value, etc.)"""
+        if not text:
+            return fallback_currency
+            
+        text = str(text).upper().strip()
+        
+        # Dolar kontrolü - gelişmiş
+        dollar_keywords = ['$', 'DOLAR', 'DOLLAR', 'USD', 'DOLAR İSARETİ', 'DOLAR IŞARETI', 'AMERİKAN DOLARI', 'AMERIKAN DOLARI']
+        if any(keyword in text for keyword in dollar_keywords):
+            return 'USD'
+        
+        # Euro kontrolü - gelişmiş
+        euro_keywords = ['€', 'EURO', 'EUR', 'AVRO', 'AVRUPA']
+        if any(keyword in text for keyword in euro_keywords):
+            return 'EUR'
+        
+        # TL kontrolü - gelişmiş
+        tl_keywords = ['₺', 'TL', 'TRY', 'TÜRK', 'LIRA', 'TÜRK LİRASI', 'TURK LIRASI', 'TURKİYE', 'TURKIYE']
+        if any(keyword in text for keyword in tl_keywords):
+            return 'TRY'
+            
+        return fallback_currency
+
+    @staticmethod
+    def _parse_general_format(df) -> List[Dict[str, Any]]:
+        """Genel format parsing"""
+        products = []
+        
+        # Gelişmiş kolon mapping
+        column_mapping = {
+            # Ürün adı varyantları
+            'ürün adı': 'product_name', 'urun adi': 'product_name', 'product name': 'product_name',
+            'ürün': 'product_name', 'urun': 'product_name', 'product': 'product_name',
+            'malzeme': 'product_name', 'malzemeler': 'product_name', 'item': 'product_name',
+            'güneş panelleri': 'product_name', 'gunes panelleri': 'product_name',
+            'solar panel': 'product_name', 'panel': 'product_name',
+            'aküler': 'product_name', 'akü': 'product_name', 'batarya': 'product_name',
+            'ad': 'product_name', 'name': 'product_name',
+            
+            # Marka varyantları (yeni)
+            'marka': 'brand', 'brand': 'brand', 'markalar': 'brand', 'brands': 'brand',
+            'üretici': 'brand', 'uretici': 'brand', 'manufacturer': 'brand',
+            'yapimci': 'brand', 'yapımcı': 'brand', 'maker': 'brand',
+            
+            # Liste fiyatı varyantları
+            'liste fiyatı': 'list_price', 'liste fiyati': 'list_price', 'list price': 'list_price',
+            'fiyat$': 'list_price', 'fiyat $': 'list_price', 'fiyat': 'list_price',
+            'liste': 'list_price', 'list': 'list_price', 'price': 'list_price',
+            'tutar': 'list_price', 'amount': 'list_price', 'maliyet': 'list_price',
+            
+            # İndirimli fiyat varyantları
+            'indirimli fiyat $': 'discounted_price', 'indirimli fiyat$': 'discounted_price',
+            'iskontolu fiyat $': 'discounted_price', 'iskontolu fiyat$': 'discounted_price',
+            'indirimli fiyat': 'discounted_price', 'indirimli fiyati': 'discounted_price',
+            'iskontolu fiyat': 'discounted_price', 'iskontolu fiyati': 'discounted_price',
+            'net fiyat': 'discounted_price', 'net price': 'discounted_price',
+            'discounted price': 'discounted_price', 'discount price': 'discounted_price',
+            'net': 'discounted_price', 'indirim': 'discounted_price', 'iskonto': 'discounted_price',
+            
+            # Para birimi varyantları
+            'para birimi': 'currency', 'currency': 'currency', 'birim': 'currency',
+            'döviz': 'currency', 'doviz': 'currency'
+        }
+        
+        # Kolonları normalize et
+        df.columns = df.columns.astype(str).str.lower().str.strip()
+        logger.info(f"Normalized columns: {list(df.columns)}")
+        
+        # Kolon mapping uygula
+        for col in df.columns:
+            for mapping_key, mapping_value in column_mapping.items():
+                if mapping_key in col:
+                    df = df.rename(columns={col: mapping_value})
+                    logger.info(f"Mapped column '{col}' to '{mapping_value}'")
+                    break
+        
+        logger.info(f"Final mapped columns: {list(df.columns)}")
+        
+        # Eğer standart kolonlar yoksa, konum bazlı mapping dene
+        if 'product_name' not in df.columns:
+            # İlk metin kolonu ürün adı olabilir
+            for col in df.columns:
+                if df[col].dtype == 'object':
+                    df = df.rename(columns={col: 'product_name'})
+                    logger.info(f"Using first text column '{col}' as product_name")
+                    break
+        
+        if 'list_price' not in df.columns:
+            # İlk sayısal kolon liste fiyatı olabilir  
+            for col in df.columns:
+                if col != 'product_name' and pd.api.types.is_numeric_dtype(df[col]):
+                    df = df.rename(columns={col: 'list_price'})
+                    logger.info(f"Using first numeric column '{col}' as list_price")
+                    break
+        
+        # Ürünleri çıkar
+        for index, row in df.iterrows():
+            try:
+                # Ürün adı
+                product_name = ""
+                if 'product_name' in row:
+                    product_name = str(row['product_name']).strip() if pd.notna(row['product_name']) else ""
+                
+                # Marka (yeni)
+                brand = ""
+                if 'brand' in row and pd.notna(row['brand']):
+                    brand = str(row['brand']).strip()
+                
+                # Liste fiyatı
+                list_price = 0
+                if 'list_price' in row:
+                    try:
+                        list_price = float(row['list_price']) if pd.notna(row['list_price']) else 0
+                    except:
+                        list_price = 0
+                
+                # İndirimli fiyat
+                discounted_price = None
+                if 'discounted_price' in row and pd.notna(row['discounted_price']):
+                    try:
+                        discounted_price = float(row['discounted_price'])
+                    except:
+                        discounted_price = None
+                
+                # Para birimi algılama - gelişmiş
+                currency = "USD"  # varsayılan
+                
+                # Önce currency sütunu varsa onu kullan
+                if 'currency' in row and pd.notna(row['currency']):
+                    detected = LegacyExcelService.detect_currency_from_text(str(row['currency']))
+                    if detected:
+                        currency = detected
+                
+                # Tüm sütunlarda para birimi işaretçilerini ara
+                for col_name, col_value in row.items():
+                    if pd.notna(col_value):
+                        cell_text = str(col_value)
+                        detected = LegacyExcelService.detect_currency_from_text(cell_text, None)
+                        if detected:
+                            currency = detected
+                            break
+                
+                # Sütun başlıklarında da para birimi ara
+                for col_name in df.columns:
+                    detected = LegacyExcelService.detect_currency_from_text(str(col_name), None)
+                    if detected:
+                        currency = detected
+                        break
+                
+                # Geçerli ürün kontrolü
+                if product_name and len(product_name) > 3 and list_price > 0:
+                    product = {
+                        'name': product_name,
+                        'brand': brand,  # Yeni: marka alanı
+                        'list_price': list_price,
+                        'currency': currency,
+                        'discounted_price': discounted_price
+                    }
+                    products.append(product)
+                    logger.info(f"Added product: {product_name[:50]}... - {list_price} {currency}")
+                else:
+                    logger.info(f"Skipped row {index}: name='{product_name}', price={list_price}")
+                    
+            except Exception as e:
+                logger.warning(f"Error processing row {index}: {e}")
+                continue
+        
+        return products
+
+
+def workbook_frames():
+    """Every sheet of the bundled workbooks, raw and as _parse_with_header sees it"""
+    import server
+    for path in sorted(ROOT.glob("*.xlsx")):
+        for sheet_name, df in pd.read_excel(path, sheet_name=None).items():
+            name = f"{path.name}[{sheet_name}]"
+            yield f"{name} raw", df
+            header_row = server.ExcelService._find_header_row(df)
+            if header_row != -1:
+                df_data = df.iloc[header_row:].copy()
+                df_data.columns = df.iloc[header_row]
+                yield f"{name} header@{header_row}", df_data.iloc[1:]
+
+
+def synthetic_frames():
+    """Edge cases the row loops handled implicitly"""
+    nan = float("nan")
+    yield "elektrozirve prices", pd.DataFrame({
+        "Güneş Panelleri": ["Liste başlığı", "Esnek Güneş Panelleri", "Panel 450W Mono", "Akü 100Ah Jel", "Kısa",
+                            "Regülatör 30A MPPT", None, 12345, "Bozuk fiyat ürünü", "Alt çizgi fiyat", "Nan fiyatlı ürün"],
+        "LİSTE FİYATI": [None, None, 1500, "2.500", 300, 450.5, 10, 99, "1.500,00", "1_000", "nan"],
+        "İskonto": [None, None, 0.1, 0.1, 0.1, 0.2, None, None, None, None, None],
+        "Net Fiyat": [None, None, 1350, 2250, 270, None, 9, 99, 1200, "٩٠٠", 5],
+    })
+    yield "elektrozirve all numeric", pd.DataFrame({
+        "a": [1, 1234567, 7654321, 42], "b": [1.5, 10, 20, 0], "c": [0, 0, 0, 0], "d": [1, 9, 20, 0],
+    })
+    havensis_rows = [[None] * 12 for _ in range(30)]
+    for i in range(12, 30):
+        havensis_rows[i][3] = ["Güneş Paneli 550W Half-Cut", "GÜNEŞ PANEL 400W", "Inverter 5kW Hibrit", "Panel",
+                               "  Monokristal panel 200W  ", 12345678901, None][i % 7]
+        havensis_rows[i][6] = [120.5, "99", None, "abc", 0, -5, 80][i % 7]
+        havensis_rows[i][8] = [110, None, "x", 95.5, "1_5", None, 70][i % 7]
+    yield "havensis", pd.DataFrame(havensis_rows, columns=[f"c{i}" for i in range(12)])
+    yield "general header currency", pd.DataFrame({
+        "Ürün Adı": ["Solar Panel 300W", "Kablo", "Akü 200Ah", None, "abc"],
+        "Marka": ["Venta", None, 5, "Havensis", "X"],
+        "Fiyat (EUR)": [100, 20, "35,5", 50, "?"],
+        "Net Fiyat": [90, None, 30, 45, "1_0"],
+    })
+    yield "general cell currency", pd.DataFrame({
+        "Ürün": ["Panel 300W", "Inverter 5kW", "Batarya 100Ah", "Kablo 6mm", "Sigorta 10A"],
+        "Açıklama": ["fiyat €", None, "TL bazlı", "battle tested", 12],
+        "Tutar": [100.0, 200.0, 300.0, 400.0, 500.0],
+        "Birim": ["$", "EURO", None, "LIRA", "?"],
+        "Tarih": [datetime(2025, 1, 1)] * 5,
+        "Aktif": [True, False, True, True, False],
+    })
+    yield "general duplicate mapping", pd.DataFrame({
+        "Ürün": ["Panel 300W", "Inverter 5kW"], "Fiyat$": [100, 200], "İskontolu Fiyat$": [90, 180],
+    })
+    yield "general positional", pd.DataFrame({
+        "x": ["Panel 300W", "Inverter 5kW", None], "y": [100, 200, 300], "z": [1, 2, 3],
+    })
+    yield "general empty", pd.DataFrame({"Ürün Adı": [], "Fiyat": []})
+
+
+def parsers_for(df):
+    """(label, legacy, vectorized) parser pairs that apply to a frame's shape"""
+    import server
+    pairs = [("general", LegacyExcelService._parse_general_format, server.ExcelService._parse_general_format)]
+    if len(df.columns) == 4:
+        pairs.append(("elektrozirve", LegacyExcelService._parse_elektrozirve_format,
+                      server.ExcelService._parse_elektrozirve_format))
+    if len(df.columns) > 8:
+        pairs.append(("havensis", LegacyExcelService._parse_havensis_format,
+                      server.ExcelService._parse_havensis_format))
+    return pairs
+
+
+def run(parser, df):
+    """Parser output, or the exception it raised"""
+    try:
+        return parser(df.copy())
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def timed(parser, df):
+    """Median ms over ITERATIONS runs"""
+    timings = []
+    for _ in range(ITERATIONS):
+        frame = df.copy()
+        start = time.perf_counter()
+        parser(frame)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def timing_frames():
+    """Large frames in each supplier format"""
+    rows = range(TIMING_ROWS)
+    yield "elektrozirve", pd.DataFrame({
+        "Güneş Panelleri": [f"Güneş Paneli {i}W Monokristal" for i in rows],
+        "LİSTE FİYATI": [100.0 + i % 500 for i in rows],
+        "İskonto": [0.1] * TIMING_ROWS,
+        "Net Fiyat": [90.0 + i % 500 for i in rows],
+    })
+    havensis = pd.DataFrame({f"c{i}": [None] * TIMING_ROWS for i in range(12)})
+    havensis["c3"] = [f"Güneş Paneli {i}W Half-Cut" for i in rows]
+    havensis["c6"] = [120.0 + i % 50 for i in rows]
+    havensis["c8"] = [110.0 + i % 50 for i in rows]
+    yield "havensis", havensis
+    yield "general", pd.DataFrame({
+        "Ürün Adı": [f"Akü {i}Ah Jel" for i in rows],
+        "Marka": ["Venta"] * TIMING_ROWS,
+        "Açıklama": ["12V derin deşarj"] * TIMING_ROWS,
+        "Liste Fiyatı": [100.0 + i % 500 for i in rows],
+        "Net": [90.0 + i % 500 for i in rows],
+        "Birim": ["USD" if i % 3 else "€" for i in rows],
+    })
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+
+    print("🧪 Excel parser regression test\n")
+    cases = passed = 0
+    for name, df in [*workbook_frames(), *synthetic_frames()]:
+        for label, legacy, vectorized in parsers_for(df):
+            cases += 1
+            expected, actual = run(legacy, df), run(vectorized, df)
+            # repr also catches type drift (numpy scalars, int vs float)
+            if repr(expected) == repr(actual):
+                passed += 1
+            else:
+                print(f"❌ {name} / {label}: outputs differ")
+                print(f"   legacy:     {repr(expected)[:300]}")
+                print(f"   vectorized: {repr(actual)[:300]}")
+    print(f"{'✅' if passed == cases else '❌'} {passed}/{cases} parser outputs identical\n")
+
+    import server
+    print(f"⏱️  {TIMING_ROWS} rows, median of {ITERATIONS}")
+    print(f"{'format':<14} {'iterrows':>10} {'vectorized':>11} {'speedup':>8}")
+    for label, df in timing_frames():
+        legacy = getattr(LegacyExcelService, f"_parse_{label}_format")
+        vectorized = getattr(server.ExcelService, f"_parse_{label}_format")
+        before, after = timed(legacy, df), timed(vectorized, df)
+        print(f"{label:<14} {before:>8.1f}ms {after:>9.1f}ms {before / after:>7.1f}x")
+
+    return passed == cases
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
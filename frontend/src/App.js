@@ -498,14 +498,11 @@ function App() {
       // Load all products at once without pagination
       params.append('skip_pagination', 'true');
       
-      // Get products and count simultaneously
-      const [productsResponse, countResponse] = await Promise.all([
-        axios.get(`${API}/products?${params.toString()}`),
-        axios.get(`${API}/products/count?${params.toString().replace(/skip_pagination=true&?/, '')}`)
-      ]);
+      // Get products and count in one request
+      const response = await axios.get(`${API}/products/page?${params.toString()}`);
       
-      const newProducts = productsResponse.data;
-      const totalCount = countResponse.data.count;
+      const newProducts = response.data.products;
+      const totalCount = response.data.total;
       
       // Always replace products since we're loading all at once
       setProducts(newProducts);
@@ -864,6 +861,22 @@ function App() {
     }
   };
 
+  const waitForImportJob = async (jobId) => {
+    // Excel içe aktarma işinin durumunu tamamlanana kadar sorgula
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      const { data: job } = await axios.get(`${API}/import-jobs/${jobId}`);
+      if (job.phase === 'completed') {
+        return job.result;
+      }
+      if (job.phase === 'failed') {
+        const error = new Error(job.error);
+        error.importError = job.error;
+        throw error;
+      }
+    }
+  };
+
   const uploadExcelFile = async () => {
     let companyId = null;
     let companyName = '';
@@ -911,6 +924,13 @@ function App() {
         headers: { 'Content-Type': 'multipart/form-data' }
       });
       
+      // İçe aktarma arka planda çalışıyor - bitene kadar durumunu sorgula
+      let result = response.data;
+      if (response.data.job_id) {
+        toast.info(response.data.message);
+        result = await waitForImportJob(response.data.job_id);
+      }
+      
       // Form alanlarını temizle
       setUploadFile(null);
       setSelectedCompany('');
@@ -918,10 +938,10 @@ function App() {
       setUploadCurrency('USD');
       setUploadDiscount('');
       await loadProducts(1, true);
-      toast.success(response.data.message);
+      toast.success(result.message);
     } catch (error) {
       console.error('Error uploading file:', error);
-      toast.error(error.response?.data?.detail || 'Dosya yüklenemedi');
+      toast.error(error.importError || error.response?.data?.detail || 'Dosya yüklenemedi');
     } finally {
       setLoading(false);
     }
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Package Hydration Benchmark
+Compares the old per-line-item find_one loop with hydrate_package ($in batch load)
+against a local mongod. Reports MongoDB round trips and latency for both.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python package_hydration_benchmark.py
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import statistics
+from pathlib import Path
+
+from pymongo import monitoring
+from motor.motor_asyncio import AsyncIOMotorClient
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+BENCH_DB = f"package_hydration_bench_{uuid.uuid4().hex[:8]}"
+PRODUCT_COUNTS = [10, 60, 150]
+SUPPLY_COUNT = 10
+ITERATIONS = 20
+
+# server.py reads these at import time
+os.environ.setdefault("MONGO_URL", MONGO_URL)
+os.environ.setdefault("DB_NAME", BENCH_DB)
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to MongoDB (one command = one round trip)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name not in ("endSessions", "hello", "isMaster", "ping"):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def load_package_before(db, package_id):
+    """Original implementation: one find_one per package product and supply"""
+    package = await db.packages.find_one({"id": package_id})
+    package_products = await db.package_products.find({"package_id": package_id}).to_list(None)
+    products = [await db.products.find_one({"id": pp["product_id"]}) for pp in package_products]
+    package_supplies = await db.package_supplies.find({"package_id": package_id}).to_list(None)
+    supplies = [await db.products.find_one({"id": ps["product_id"]}) for ps in package_supplies]
+    return package, products, supplies
+
+
+async def seed(db, product_count):
+    """Create a package with product_count products and SUPPLY_COUNT supplies"""
+    package_id = str(uuid.uuid4())
+    products = [{"id": str(uuid.uuid4()), "name": f"Ürün {i}", "list_price": 100 + i,
+                 "list_price_try": 3000 + i, "currency": "USD"}
+                for i in range(product_count + SUPPLY_COUNT)]
+    await db.products.insert_many(products)
+    await db.packages.insert_one({"id": package_id, "name": f"Paket {product_count}", "sale_price": 0})
+    await db.package_products.insert_many([
+        {"id": str(uuid.uuid4()), "package_id": package_id, "product_id": p["id"], "quantity": 1}
+        for p in products[:product_count]
+    ])
+    await db.package_supplies.insert_many([
+        {"id": str(uuid.uuid4()), "package_id": package_id, "product_id": p["id"], "quantity": 1}
+        for p in products[product_count:]
+    ])
+    return package_id
+
+
+async def measure(counter, loader):
+    """Return (round trips per call, median ms, p95 ms)"""
+    timings = []
+    counter.count = 0
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        await loader()
+        timings.append((time.perf_counter() - start) * 1000)
+    round_trips = counter.count / ITERATIONS
+    timings.sort()
+    return round_trips, statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+async def main():
+    import server
+
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(MONGO_URL, event_listeners=[counter])
+    db = client[BENCH_DB]
+    await db.products.create_index("id")
+    await db.package_products.create_index("package_id")
+    await db.package_supplies.create_index("package_id")
+    server.db = db
+
+    print(f"📦 Package hydration benchmark ({MONGO_URL}, {ITERATIONS} iterations)\n")
+    print(f"{'items':>6} | {'before RT':>9} {'median':>9} {'p95':>9} | {'after RT':>8} {'median':>9} {'p95':>9}")
+    try:
+        for product_count in PRODUCT_COUNTS:
+            package_id = await seed(db, product_count)
+            before = await measure(counter, lambda: load_package_before(db, package_id))
+            after = await measure(counter, lambda: server.hydrate_package(package_id))
+            print(f"{product_count + SUPPLY_COUNT:>6} | {before[0]:>9.0f} {before[1]:>7.2f}ms {before[2]:>7.2f}ms"
+                  f" | {after[0]:>8.0f} {after[1]:>7.2f}ms {after[2]:>7.2f}ms")
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
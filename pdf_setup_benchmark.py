@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+PDF Setup Micro-Benchmark
+Measures per-PDF setup cost (font registration, stylesheet, styles, logo decode)
+when built per request versus taken from the process-wide PDF resource registry,
+and the resulting end-to-end quote render time. No database needed.
+
+Usage:
+    python pdf_setup_benchmark.py
+"""
+
+import os
+import sys
+import time
+import tempfile
+import statistics
+import logging
+from pathlib import Path
+
+ITERATIONS = 30
+
+# server.py reads these at import time; no connection is made
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "pdf_setup_bench")
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+SAMPLE_QUOTE = {
+    "name": "Benchmark Teklif",
+    "customer_name": "Test Müşteri",
+    "created_at": "2025-01-01T10:00:00",
+    "products": [
+        {"name": f"Ürün {i} - Güneş paneli 450W", "quantity": 2, "list_price_try": 1500 + i,
+         "discounted_price_try": 1400 + i, "currency": "USD"}
+        for i in range(25)
+    ],
+    "total_list_price": 80000,
+    "total_discounted_price": 75000,
+    "discount_percentage": 5,
+    "labor_cost": 2500,
+    "total_net_price": 73500,
+}
+
+
+def timed(func, iterations=ITERATIONS):
+    """Return (median ms, p95 ms)"""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def render_quote(server):
+    """Render SAMPLE_QUOTE to a temp file, as the quote PDF endpoint does"""
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as output:
+        output_path = output.name
+    try:
+        server.render_quote_pdf(output_path, SAMPLE_QUOTE, 50.0)
+    finally:
+        os.unlink(output_path)
+
+
+def main():
+    import server
+    logging.disable(logging.CRITICAL)
+
+    print(f"📄 PDF setup micro-benchmark ({ITERATIONS} iterations)\n")
+
+    # Before: every generator rebuilt fonts, styles and decoded the logo itself
+    per_request_setup = timed(lambda: server.PDFResources())
+    # After: generators take everything from the shared registry
+    server.get_pdf_resources()
+    shared_setup = timed(lambda: server.PDFQuoteGenerator(eur_rate=50.0))
+
+    def render_per_request():
+        server.get_pdf_resources.cache_clear()
+        render_quote(server)
+
+    per_request_render = timed(render_per_request)
+    server.get_pdf_resources()
+    shared_render = timed(lambda: render_quote(server))
+
+    print(f"{'':<28} {'median':>10} {'p95':>10}")
+    print(f"{'setup per request':<28} {per_request_setup[0]:>8.2f}ms {per_request_setup[1]:>8.2f}ms")
+    print(f"{'setup from registry':<28} {shared_setup[0]:>8.2f}ms {shared_setup[1]:>8.2f}ms")
+    print(f"{'quote render (per request)':<28} {per_request_render[0]:>8.2f}ms {per_request_render[1]:>8.2f}ms")
+    print(f"{'quote render (registry)':<28} {shared_render[0]:>8.2f}ms {shared_render[1]:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Product Search Benchmark
+Compares search-as-you-type latency of the old six-clause $regex $or, the indexed
+search_key prefix query and the in-memory trigram index (PRODUCT_SEARCH_INDEX=1)
+against a local mongod, on synthetic catalogs of 1k/10k/100k products.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python product_search_benchmark.py
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import statistics
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+BENCH_DB = f"product_search_bench_{uuid.uuid4().hex[:8]}"
+CATALOG_SIZES = [1_000, 10_000, 100_000]
+QUERIES = ["akü", "aku 100", "inverter", "invertr", "esnek panel", "ışıklı şalter", "450w"]
+ITERATIONS = 10
+PAGE_SIZE = 100
+
+# server.py reads these at import time
+os.environ.setdefault("MONGO_URL", MONGO_URL)
+os.environ.setdefault("DB_NAME", BENCH_DB)
+os.environ["PRODUCT_SEARCH_INDEX"] = "1"
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+WORDS = ["Güneş", "Paneli", "Esnek", "Monokristal", "Half-Cut", "Akü", "Jel", "Lityum", "İnvertör", "Hibrit",
+         "Şarj", "Kontrol", "Cihazı", "Işıklı", "Şalter", "Sigorta", "Kablo", "Pabuç", "Röle", "Modülü",
+         "Karavan", "Montaj", "Seti", "Trifaze", "On-Grid", "Off-Grid", "Full", "Black", "Apex", "Tam"]
+BRANDS = ["Apex", "Venta", "Havensis", "Elektrozirve", "Çağ Enerji", "Lexron", "Tommatech"]
+
+
+def regex_query_before(search):
+    """Original implementation: unanchored case-insensitive regexes on raw and normalized text"""
+    def normalize_turkish(text):
+        replacements = {
+            'ç': 'c', 'ğ': 'g', 'ı': 'i', 'ö': 'o', 'ş': 's', 'ü': 'u',
+            'Ç': 'C', 'Ğ': 'G', 'I': 'I', 'Ö': 'O', 'Ş': 'S', 'Ü': 'U'
+        }
+        for tr, en in replacements.items():
+            text = text.replace(tr, en)
+        return text
+
+    search_term = search.strip()
+    normalized_search = normalize_turkish(search_term)
+    return {"$or": [
+        {"name": {"$regex": search_term, "$options": "i"}},
+        {"name": {"$regex": normalized_search, "$options": "i"}},
+        {"description": {"$regex": search_term, "$options": "i"}},
+        {"brand": {"$regex": search_term, "$options": "i"}},
+        {"description": {"$regex": normalized_search, "$options": "i"}},
+        {"brand": {"$regex": normalized_search, "$options": "i"}}
+    ]}
+
+
+def synthetic_product(server, rng, index):
+    name = f"{rng.randint(1, 600)}{rng.choice(['W', 'Ah', 'A', 'KW'])} " + " ".join(rng.sample(WORDS, rng.randint(2, 5)))
+    product = {
+        "id": str(uuid.uuid4()),
+        "name": f"{name} {index}",
+        "brand": rng.choice(BRANDS),
+        "description": " ".join(rng.sample(WORDS, 4)) if rng.random() < 0.3 else None,
+        "is_favorite": rng.random() < 0.02,
+    }
+    product["search_key"] = server.product_search_key(product)
+    return product
+
+
+async def seed(server, db, size):
+    """Grow the catalog to size products"""
+    rng = random.Random(size)
+    have = await db.products.estimated_document_count()
+    batch = []
+    for index in range(have, size):
+        batch.append(InsertOne(synthetic_product(server, rng, index)))
+        if len(batch) == 5000:
+            await db.products.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.products.bulk_write(batch, ordered=False)
+
+
+async def first_page(db, query):
+    return await db.products.find(query, {"_id": 0, "id": 1}).sort(
+        [("is_favorite", -1), ("name", 1)]).limit(PAGE_SIZE).to_list(PAGE_SIZE)
+
+
+async def measure(func):
+    """Return (median ms, p95 ms) over all queries"""
+    timings = []
+    for _ in range(ITERATIONS):
+        for query in QUERIES:
+            start = time.perf_counter()
+            await func(query)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+async def main():
+    import server
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[BENCH_DB]
+    server.db = db
+    await db.products.create_index("id")
+    await db.products.create_index("search_key")
+    await db.products.create_index([("is_favorite", -1), ("name", 1)])
+
+    print(f"🔎 Product search benchmark ({MONGO_URL}, {len(QUERIES)} queries x {ITERATIONS})\n")
+    print(f"{'products':>8} | {'$regex median':>13} {'p95':>9} | {'prefix median':>13} {'p95':>9}"
+          f" | {'trigram median':>14} {'p95':>9} {'build':>8}")
+    try:
+        for size in CATALOG_SIZES:
+            await seed(server, db, size)
+            server.product_search_index = server.TrigramSearchIndex()
+            started = time.perf_counter()
+            await server.build_product_search_index()
+            build = time.perf_counter() - started
+
+            async def prefix(search):
+                server.product_search_index.ready = False
+                try:
+                    return await first_page(db, server.product_search_query(search))
+                finally:
+                    server.product_search_index.ready = True
+
+            before = await measure(lambda search: first_page(db, regex_query_before(search)))
+            after_prefix = await measure(prefix)
+            after_trigram = await measure(lambda search: first_page(db, server.product_search_query(search)))
+            print(f"{size:>8} | {before[0]:>11.2f}ms {before[1]:>7.2f}ms | {after_prefix[0]:>11.2f}ms {after_prefix[1]:>7.2f}ms"
+                  f" | {after_trigram[0]:>12.2f}ms {after_trigram[1]:>7.2f}ms {build:>7.2f}s")
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())